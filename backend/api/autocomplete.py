@@ -0,0 +1,95 @@
+"""Индекс автодополнения ингредиентов в памяти процесса."""
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Count
+
+from recipes.models import Ingredient, RecipeIngredient
+
+from .cache import INGREDIENTS_NAMESPACE, RECIPES_NAMESPACE, ProcessLocalValue
+
+NGRAM_SIZE = 3
+
+
+def ngrams(value):
+    return {
+        value[i:i + NGRAM_SIZE] for i in range(len(value) - NGRAM_SIZE + 1)
+    }
+
+
+class IngredientIndex:
+    """Поиск ингредиентов по вхождению в начало и в середину названия.
+
+    Порядок результата совпадает с IngredientFilter: сначала совпадения
+    с начала названия, затем вхождения в середину, внутри группы - в
+    порядке rows (порядок БД по названию с её правилами сравнения строк)
+    или по частоте использования в рецептах, если передан usage."""
+
+    def __init__(self, rows, usage=None):
+        usage = usage or {}
+        self.rows = rows
+        self.names = [row['name'].lower() for row in rows]
+        self.sort_keys = [
+            (-usage.get(row['id'], 0), position)
+            for position, row in enumerate(rows)
+        ]
+        self.prefixes = sorted(
+            (name, position) for position, name in enumerate(self.names))
+        self.ngrams = defaultdict(set)
+        for position, name in enumerate(self.names):
+            for ngram in ngrams(name):
+                self.ngrams[ngram].add(position)
+
+    def search(self, value):
+        value = value.lower()
+        start = bisect_left(self.prefixes, (value,))
+        prefix_matches = set()
+        for name, position in self.prefixes[start:]:
+            if not name.startswith(value):
+                break
+            prefix_matches.add(position)
+
+        if len(value) >= NGRAM_SIZE:
+            candidates = set.intersection(
+                *(self.ngrams.get(ngram, set()) for ngram in ngrams(value)))
+        else:
+            candidates = range(len(self.names))
+        contains_matches = {
+            position for position in candidates
+            if position not in prefix_matches
+            and value in self.names[position]
+        }
+        return [
+            self.rows[position]
+            for group in (prefix_matches, contains_matches)
+            for position in sorted(group, key=self.sort_keys.__getitem__)
+        ]
+
+
+def build_ingredient_index(serializer_class, rank_by_usage):
+    # Порядок по названию задаёт БД, как в IngredientFilter.
+    rows = serializer_class(
+        Ingredient.objects.order_by('name'), many=True).data
+    usage = None
+    if rank_by_usage:
+        usage = dict(
+            RecipeIngredient.objects
+            .order_by()
+            .values('ingredient')
+            .annotate(count=Count('id'))
+            .values_list('ingredient', 'count')
+        )
+    return IngredientIndex(rows, usage)
+
+
+ingredient_index = ProcessLocalValue(build_ingredient_index)
+
+
+def get_ingredient_index(serializer_class):
+    """Индекс, перестраиваемый после изменения ингредиентов."""
+    rank_by_usage = settings.INGREDIENT_AUTOCOMPLETE_RANK_BY_USAGE
+    namespaces = (INGREDIENTS_NAMESPACE,)
+    if rank_by_usage:
+        namespaces += (RECIPES_NAMESPACE,)
+    return ingredient_index.get(namespaces, serializer_class, rank_by_usage)
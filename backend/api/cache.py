@@ -0,0 +1,146 @@
+"""Кеширование ответов API."""
+from hashlib import md5, sha256
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.crypto import get_random_string
+from rest_framework import status
+from rest_framework.response import Response
+
+VERSION_KEY_PREFIX = 'cache_version'
+VERSION_LENGTH = 12
+# Пространства имён кеша, версии которых меняются сигналами api.signals.
+RECIPES_NAMESPACE = 'recipes'
+TAGS_NAMESPACE = 'tags'
+INGREDIENTS_NAMESPACE = 'ingredients'
+USERS_NAMESPACE = 'users'
+
+
+def get_cache_versions(*namespaces):
+    """Текущие версии пространств имён кеша одной строкой.
+
+    Версия - случайная строка, поэтому после вытеснения ключа версии
+    из кеша старые записи не могут стать снова актуальными."""
+    keys = [f'{VERSION_KEY_PREFIX}:{namespace}' for namespace in namespaces]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, get_random_string(VERSION_LENGTH), None)
+            versions[key] = cache.get(key)
+    return '.'.join(versions[key] for key in keys)
+
+
+def bump_cache_version(*namespaces):
+    """Инвалидирует все записи, зависящие от пространств имён."""
+    cache.set_many(
+        {
+            f'{VERSION_KEY_PREFIX}:{namespace}': get_random_string(
+                VERSION_LENGTH)
+            for namespace in namespaces
+        },
+        None
+    )
+
+
+def get_response_cache_key(request, namespaces):
+    """Ключ ответа: хост, путь и нормализованные параметры запроса."""
+    params = '&'.join(
+        f'{name}={",".join(sorted(request.query_params.getlist(name)))}'
+        for name in sorted(request.query_params)
+    )
+    digest = md5(
+        f'{request.get_host()}{request.path}?{params}'.encode()
+    ).hexdigest()
+    return f'response:{get_cache_versions(*namespaces)}:{digest}'
+
+
+def user_namespace(user_id):
+    """Пространство имён избранного, списка покупок и подписок
+    пользователя."""
+    return f'user:{user_id}'
+
+
+def make_etag(*parts):
+    """Строгий ETag из значений, от которых зависит ответ."""
+    return f'"{sha256(repr(parts).encode()).hexdigest()}"'
+
+
+def conditional_response(request, get_response, etag):
+    """Ответ на условный GET.
+
+    Возвращает 304, если клиентская копия актуальна, иначе ответ
+    get_response()."""
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = get_response()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+    response['ETag'] = etag
+    return response
+
+
+class ProcessLocalValue:
+    """Значение в памяти процесса, которое строится заново при смене версий
+    пространств имён кеша или по истечении PROCESS_LOCAL_CACHE_TTL.
+
+    Если кеш общий для процессов (см. CACHES), изменение в одном процессе
+    приводит к перестроению значения во всех процессах при следующем
+    обращении. TTL ограничивает устаревание, если смена версии не дошла
+    до процесса."""
+
+    def __init__(self, build):
+        self.build = build
+        self.value = None
+        self.version = None
+        self.built_at = None
+        self.lock = Lock()
+
+    def is_fresh(self, version):
+        return (
+            self.version == version
+            and monotonic() - self.built_at < settings.PROCESS_LOCAL_CACHE_TTL
+        )
+
+    def get(self, namespaces, *args):
+        """Возвращает значение build(*args) для текущих версий."""
+        version = (args, get_cache_versions(*namespaces))
+        if not self.is_fresh(version):
+            with self.lock:
+                if not self.is_fresh(version):
+                    self.value = self.build(*args)
+                    self.version = version
+                    self.built_at = monotonic()
+        return self.value
+
+
+class AnonymousResponseCacheMixin:
+    """Кеширование ответов list и retrieve для анонимных пользователей.
+
+    Ответы анонимных пользователей одинаковы, поэтому хранятся в общем
+    кеше до изменения моделей из cache_dependencies (см. api.signals)."""
+
+    cache_dependencies = ()
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        key = get_response_cache_key(request, self.cache_dependencies)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data,
+                      settings.API_RESPONSE_CACHE_TIMEOUT)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().retrieve, request, *args, **kwargs)
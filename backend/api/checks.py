@@ -0,0 +1,25 @@
+"""Проверки настроек приложения api."""
+from django.conf import settings
+from django.core.checks import Warning, register
+
+# Бэкенды кеша, не общие для процессов.
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """Версии кеша (api.cache) должны быть видны всем процессам."""
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.DEBUG or backend not in PROCESS_LOCAL_CACHE_BACKENDS:
+        return []
+    return [
+        Warning(
+            f'Кеш {backend} не общий для процессов: изменения, сделанные '
+            f'командами и другими воркерами, не сбросят кеш ответов.',
+            hint='Используйте Redis, Memcached или DatabaseCache.',
+            id='api.W001',
+        )
+    ]
@@ -0,0 +1,100 @@
+"""Потоковая выгрузка данных в NDJSON.
+
+Рецепты с ингредиентами и тегами, избранное, списки покупок и подписки
+читаются серверными курсорами порциями по chunk_size, поэтому память
+не зависит от объёма данных. Каждая строка - объект JSON с полем type."""
+import json
+import zlib
+from datetime import datetime, time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from foodgram_backend.constants import EXPORT_CHUNK_SIZE
+from recipes.models import (Favorites, Recipe, RecipeIngredient, ShoppingList,
+                            Tag)
+from users.models import Subscription
+
+# Тип записи, модель и выгружаемые поля.
+RELATIONS = (
+    ('favorite', Favorites, ('user_id', 'recipe_id', 'created_at')),
+    ('shopping_list', ShoppingList, ('user_id', 'recipe_id', 'created_at')),
+    ('subscription', Subscription,
+     ('subscriber_id', 'user_id', 'created_at')),
+)
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def parse_since(value):
+    """Дата или дата и время ISO 8601, без зоны - в зоне проекта."""
+    since = parse_datetime(value)
+    if since is None:
+        since_date = parse_date(value)
+        if since_date is None:
+            raise ValueError(f'Неверная дата: {value}')
+        since = datetime.combine(since_date, time.min)
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def iter_recipes(since, chunk_size):
+    queryset = Recipe.objects.order_by('id').prefetch_related(
+        Prefetch(
+            'recipe_ingredient',
+            queryset=RecipeIngredient.objects.order_by('ingredient_id')
+        ),
+        Prefetch('tags', queryset=Tag.objects.only('id').order_by('id'))
+    )
+    if since:
+        queryset = queryset.filter(updated_at__gte=since)
+    for recipe in queryset.iterator(chunk_size=chunk_size):
+        yield {
+            'type': 'recipe',
+            'id': recipe.id,
+            'author_id': recipe.author_id,
+            'name': recipe.name,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'image': recipe.image.name,
+            'link': recipe.link,
+            'created_at': recipe.created_at,
+            'updated_at': recipe.updated_at,
+            'tags': [tag.id for tag in recipe.tags.all()],
+            'ingredients': [
+                {'id': row.ingredient_id, 'amount': row.amount}
+                for row in recipe.recipe_ingredient.all()
+            ],
+        }
+
+
+def iter_relations(since, chunk_size):
+    for record_type, model, fields in RELATIONS:
+        queryset = model.objects.order_by('id').values(*fields)
+        if since:
+            queryset = queryset.filter(created_at__gte=since)
+        for row in queryset.iterator(chunk_size=chunk_size):
+            yield {'type': record_type, **row}
+
+
+def iter_dump(since=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Строки NDJSON со всеми данными или изменёнными начиная с since.
+
+    Удаления в выгрузку не попадают."""
+    for records in (iter_recipes(since, chunk_size),
+                    iter_relations(since, chunk_size)):
+        for record in records:
+            yield json.dumps(record, cls=DjangoJSONEncoder,
+                             ensure_ascii=False) + '\n'
+
+
+def gzip_chunks(lines):
+    """Сжимает строки в поток gzip по мере их поступления."""
+    compressor = zlib.compressobj(wbits=GZIP_WBITS)
+    for line in lines:
+        chunk = compressor.compress(line.encode())
+        if chunk:
+            yield chunk
+    yield compressor.flush()
@@ -0,0 +1,109 @@
+"""Потоковая выгрузка списка покупок."""
+import csv
+import json
+
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.encoding import force_bytes
+from rest_framework.negotiation import DefaultContentNegotiation
+
+from foodgram_backend.constants import (SHOPPING_LIST_CACHE_MAX_SIZE,
+                                        SHOPPING_LIST_CACHE_TIMEOUT)
+
+SHOPPING_LIST_TITLE = 'Список покупок:'
+SHOPPING_LIST_FILE_NAME = 'shopping_cart'
+
+
+class IgnoreFormatContentNegotiation(DefaultContentNegotiation):
+    """Параметр format выбирает формат файла, а не рендерер DRF."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+def format_line(number, row):
+    return (f'{number}) {row["name"]} ({row["measurement_unit"]}): '
+            f'{row["amount"]}')
+
+
+def iter_txt(rows):
+    yield f'{SHOPPING_LIST_TITLE}\n\n'
+    for number, row in enumerate(rows, start=1):
+        yield f'{format_line(number, row)}\n'
+
+
+class Echo:
+    """Буфер для csv.writer, который возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('№', 'Ингредиент', 'Единица измерения',
+                           'Количество'))
+    for number, row in enumerate(rows, start=1):
+        yield writer.writerow((number, row['name'], row['measurement_unit'],
+                               row['amount']))
+
+
+def iter_json(rows):
+    yield '['
+    for number, row in enumerate(rows):
+        item = json.dumps(
+            {
+                'name': row['name'],
+                'measurement_unit': row['measurement_unit'],
+                'amount': row['amount'],
+            },
+            ensure_ascii=False
+        )
+        yield f',{item}' if number else item
+    yield ']'
+
+
+# Формат: (content type, генератор частей файла).
+SHOPPING_LIST_FORMATS = {
+    'txt': ('text/plain; charset=utf-8', iter_txt),
+    'csv': ('text/csv; charset=utf-8', iter_csv),
+    'json': ('application/json', iter_json),
+}
+
+
+def cache_chunks(chunks, cache_key):
+    """Отдаёт части файла и после последней сохраняет файл в кеш.
+
+    Файл больше SHOPPING_LIST_CACHE_MAX_SIZE не кешируется, собранные
+    части отбрасываются, как только размер превышен."""
+    content, size = [], 0
+    for chunk in chunks:
+        yield chunk
+        if content is None:
+            continue
+        content.append(force_bytes(chunk))
+        size += len(content[-1])
+        if size > SHOPPING_LIST_CACHE_MAX_SIZE:
+            content = None
+    if content is not None:
+        cache.set(cache_key, b''.join(content), SHOPPING_LIST_CACHE_TIMEOUT)
+
+
+def shopping_list_response(rows, file_format, cache_key=None):
+    """Ответ со списком покупок в формате file_format.
+
+    rows - итератор словарей с ключами name, measurement_unit и amount.
+    Если передан cache_key, готовый файл берётся из кеша, а файл,
+    собранный потоком, сохраняется в кеш."""
+    content_type, iter_content = SHOPPING_LIST_FORMATS[file_format]
+    content = cache.get(cache_key) if cache_key else None
+    if content is not None:
+        response = HttpResponse(content, content_type=content_type)
+    else:
+        chunks = iter_content(rows)
+        if cache_key:
+            chunks = cache_chunks(chunks, cache_key)
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = (
+        f'attachment; filename="{SHOPPING_LIST_FILE_NAME}.{file_format}"')
+    return response
@@ -0,0 +1,111 @@
+"""Быстрая сериализация рецептов для чтения.
+
+Формирует тот же JSON, что и RecipeSerializer, но без полей DRF: данные
+связанных объектов загружаются запросами .values() для всей страницы
+и собираются в словари."""
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from rest_framework import serializers
+
+from recipes.models import Recipe, RecipeIngredient
+
+from .serializers import RecipeListSerializer, RecipeSerializer
+
+User = get_user_model()
+
+# Представление дат так же, как у полей DateTimeField в TagSerializer.
+datetime_field = serializers.DateTimeField()
+
+
+def file_url(field, name):
+    """url файла так же, как FieldFile.url, или None для пустого поля."""
+    if not name:
+        return None
+    return field.storage.url(name)
+
+
+def build_recipe_fragments(recipes):
+    """Фрагменты рецептов (без полей текущего пользователя) по id."""
+    recipe_ids = [recipe.pk for recipe in recipes]
+    author_avatar = User._meta.get_field('avatar')
+    recipe_image = Recipe._meta.get_field('image')
+
+    authors = {
+        author['id']: {
+            'email': author['email'],
+            'id': author['id'],
+            'username': author['username'],
+            'first_name': author['first_name'],
+            'last_name': author['last_name'],
+            'avatar': file_url(author_avatar, author['avatar']),
+        }
+        for author in User.objects.filter(
+            id__in={recipe.author_id for recipe in recipes}
+        ).values('id', 'email', 'username', 'first_name', 'last_name',
+                 'avatar')
+    }
+
+    tags = defaultdict(list)
+    for row in (
+        Recipe.tags.through.objects
+        .filter(recipe_id__in=recipe_ids)
+        .values('recipe_id', 'tag__id', 'tag__name', 'tag__slug',
+                'tag__created_at')
+        .order_by('tag__name')
+    ):
+        tags[row['recipe_id']].append({
+            'id': row['tag__id'],
+            'name': row['tag__name'],
+            'slug': row['tag__slug'],
+            'created_at': datetime_field.to_representation(
+                row['tag__created_at']),
+        })
+
+    ingredients = defaultdict(list)
+    for row in (
+        RecipeIngredient.objects
+        .filter(recipe_id__in=recipe_ids)
+        .values('recipe_id', 'ingredient_id', 'ingredient__name',
+                'ingredient__measurement_unit', 'amount')
+        .order_by('recipe_id', 'ingredient_id')
+    ):
+        ingredients[row['recipe_id']].append({
+            'id': row['ingredient_id'],
+            'name': row['ingredient__name'],
+            'measurement_unit': row['ingredient__measurement_unit'],
+            'amount': row['amount'],
+        })
+
+    return {
+        recipe.pk: {
+            'id': recipe.pk,
+            'tags': tags[recipe.pk],
+            'author': authors[recipe.author_id],
+            'ingredients': ingredients[recipe.pk],
+            'name': recipe.name,
+            'image': file_url(recipe_image, recipe.image.name),
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+        }
+        for recipe in recipes
+    }
+
+
+class FastRecipeListSerializer(RecipeListSerializer):
+    """Список рецептов, фрагменты которого собираются без полей DRF."""
+
+    def build_fragments(self, recipes):
+        return build_recipe_fragments(recipes)
+
+
+class FastRecipeSerializer(RecipeSerializer):
+    """Сериализатор рецепта только для чтения с тем же выводом, что и
+    RecipeSerializer. Включается настройкой RECIPE_FAST_SERIALIZER."""
+
+    class Meta(RecipeSerializer.Meta):
+        list_serializer_class = FastRecipeListSerializer
+
+    def to_representation(self, instance):
+        fragment = build_recipe_fragments([instance])[instance.pk]
+        return self.merge_user_fields(fragment, instance)
@@ -2,23 +2,31 @@ from django.db.models import Case, IntegerField, Q, Value, When
 from django.utils.translation import gettext_lazy as _
 from django_filters import rest_framework
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Ingredient, Recipe
+from recipes.search import search_recipes
+
+from .registries import tag_slug_choices
 
 
 class RecipeFilter(rest_framework.FilterSet):
-    """Фильтрация рецепта по автору, тегам и ингредиентам."""
+    """Фильтрация рецепта по автору, тегам, ингредиентам и поиск по
+    названию и описанию."""
 
     author = rest_framework.NumberFilter(
         field_name='author_id',
         lookup_expr='exact'
     )
-    tags = rest_framework.ModelMultipleChoiceFilter(
+    tags = rest_framework.MultipleChoiceFilter(
         field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all()
+        choices=tag_slug_choices
     )
     ingredients = rest_framework.CharFilter(
         method='filter_ingredients_icontains')
+    search = rest_framework.CharFilter(
+        method='filter_search',
+        label=_('Поиск'),
+        help_text=_('Поиск по названию и описанию рецепта, результаты '
+                    'упорядочены по релевантности'))
     is_favorited = rest_framework.BooleanFilter(
         method='filter_is_favorited',
         label=_('В избранном'),
@@ -34,11 +42,15 @@ class RecipeFilter(rest_framework.FilterSet):
         model = Recipe
         fields = (
             'is_favorited', 'is_in_shopping_cart', 'author', 'tags',
-            'ingredients')
+            'ingredients', 'search')
 
     def filter_ingredients_icontains(self, queryset, name, value):
         return queryset.filter(ingredients__name__icontains=value)
 
+    def filter_search(self, queryset, name, value):
+        # В курсорном режиме пагинации порядок задаёт пагинатор.
+        return search_recipes(queryset, value)
+
     def filter_is_favorited(self, queryset, name, value):
         if self.request.user.is_authenticated:
             return queryset.filter(favorites__user=self.request.user.id)
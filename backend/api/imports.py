@@ -0,0 +1,155 @@
+"""Массовый импорт рецептов.
+
+Записи проверяются пачками: ингредиенты всей пачки загружаются одним
+запросом, теги берутся из справочника, проверка записей и сохранение
+картинок выполняются в пуле потоков. Рецепты, их ингредиенты и теги
+создаются через bulk_create в одной транзакции на пачку."""
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.db import DatabaseError, transaction
+from rest_framework.settings import api_settings
+
+from foodgram_backend.constants import (BATCH_SIZE, IMPORT_BATCH_SIZE,
+                                        IMPORT_WORKERS)
+from recipes.counters import increment_counter
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+
+from .cache import RECIPES_NAMESPACE, bump_cache_version
+from .registries import get_tag_registry
+from .serializers import RecipeCreateSerializer
+
+
+class RecipeImportSerializer(RecipeCreateSerializer):
+    """Рецепт из файла импорта, автор задаётся импортом."""
+
+    author = None
+
+    class Meta(RecipeCreateSerializer.Meta):
+        fields = ('ingredients', 'tags', 'image', 'name', 'text',
+                  'cooking_time')
+
+
+def ingredient_ids(records):
+    """id ингредиентов, упомянутых в записях, без проверки записей."""
+    ids = set()
+    for record in records:
+        if not isinstance(record, dict):
+            continue
+        for ingredient in record.get('ingredients') or ():
+            try:
+                ids.add(int(ingredient['id']))
+            except (KeyError, TypeError, ValueError):
+                pass
+    return ids
+
+
+class RecipeImporter:
+    """Импорт рецептов автора author.
+
+    Результат - словарь с количеством созданных рецептов и ошибками
+    записей по их номеру в файле (с нуля)."""
+
+    def __init__(self, author, batch_size=IMPORT_BATCH_SIZE,
+                 workers=IMPORT_WORKERS):
+        self.author = author
+        self.batch_size = batch_size
+        self.workers = workers
+        self.created = 0
+        self.errors = []
+
+    def run(self, records):
+        """records - итератор пар (запись, ошибка разбора)."""
+        records = enumerate(records)
+        with ThreadPoolExecutor(self.workers) as executor:
+            while batch := list(islice(records, self.batch_size)):
+                self.import_batch(executor, batch)
+        return {'created': self.created, 'errors': self.errors}
+
+    def add_error(self, index, errors):
+        if isinstance(errors, str):
+            errors = {api_settings.NON_FIELD_ERRORS_KEY: [errors]}
+        self.errors.append({'index': index, 'errors': errors})
+
+    def validate(self, record, context):
+        """Проверяет запись и сохраняет её картинку в хранилище."""
+        serializer = RecipeImportSerializer(data=record, context=context)
+        if not serializer.is_valid():
+            return None, serializer.errors
+        data = serializer.validated_data
+        recipe = Recipe(
+            author=self.author,
+            name=data['name'],
+            text=data['text'],
+            cooking_time=data['cooking_time']
+        )
+        recipe.image.save(data['image'].name, data['image'], save=False)
+        return (recipe, data['tags'], data['recipe_ingredients']), None
+
+    def import_batch(self, executor, batch):
+        records = []
+        for index, (record, error) in batch:
+            if error is None:
+                records.append((index, record))
+            else:
+                self.add_error(index, error)
+        context = {
+            'ingredients': Ingredient.objects.in_bulk(
+                ingredient_ids(record for _, record in records)),
+            'tags': get_tag_registry().by_id,
+        }
+        valid = []
+        for (index, _), (result, errors) in zip(
+            records,
+            executor.map(
+                lambda item: self.validate(item[1], context), records)
+        ):
+            if errors:
+                self.add_error(index, errors)
+            else:
+                valid.append((index, result))
+        if not valid:
+            return
+        try:
+            self.save(result for _, result in valid)
+        except DatabaseError as error:
+            for index, _ in valid:
+                self.add_error(index, f'Ошибка записи в БД: {error}')
+            return
+        self.created += len(valid)
+        # bulk_create не отправляет сигналы, которые меняют версию кеша.
+        bump_cache_version(RECIPES_NAMESPACE)
+
+    @transaction.atomic()
+    def save(self, results):
+        results = list(results)
+        recipes = [recipe for recipe, _, _ in results]
+        for recipe, link in zip(recipes, Recipe.generate_links(len(recipes))):
+            recipe.link = link
+        Recipe.objects.bulk_create(recipes, batch_size=BATCH_SIZE)
+        RecipeIngredient.objects.bulk_create(
+            (
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient=ingredient['ingredient'],
+                    amount=ingredient['amount']
+                )
+                for recipe, _, ingredients in results
+                for ingredient in ingredients
+            ),
+            batch_size=BATCH_SIZE
+        )
+        Recipe.tags.through.objects.bulk_create(
+            (
+                Recipe.tags.through(recipe=recipe, tag=tag)
+                for recipe, tags, _ in results
+                for tag in tags
+            ),
+            batch_size=BATCH_SIZE
+        )
+        increment_counter(
+            type(self.author), self.author.pk, 'recipes_count', len(recipes))
+
+
+def import_recipes(author, records, **kwargs):
+    return RecipeImporter(author, **kwargs).run(records)
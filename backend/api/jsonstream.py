@@ -0,0 +1,95 @@
+"""Потоковое чтение JSON-массива и NDJSON.
+
+В памяти держится только текущая запись, поэтому файлы импорта и тела
+запросов любого размера читаются без загрузки целиком."""
+import json
+from itertools import chain
+
+JSON_READ_SIZE = 64 * 1024
+
+
+def skip_whitespace(stream):
+    """Первый непробельный символ потока или '' в конце потока."""
+    while True:
+        char = stream.read(1)
+        if not char or not char.isspace():
+            return char
+
+
+def is_blank(text, stream):
+    """В text и остатке потока только пробельные символы."""
+    while text:
+        if not text.isspace():
+            return False
+        text = stream.read(JSON_READ_SIZE)
+    return True
+
+
+def iter_json_array(stream):
+    """Элементы JSON-массива, открывающая скобка которого уже прочитана.
+
+    Поток читается частями по JSON_READ_SIZE, в памяти - только текущий
+    элемент. Возвращает пары (элемент, ошибка разбора), после ошибки
+    разбор прекращается."""
+    decoder = json.JSONDecoder()
+    buffer, position, eof = '', 0, False
+    # Что может идти дальше: элемент или ], элемент, запятая или ].
+    expected = 'item_or_end'
+    while True:
+        while position < len(buffer) and buffer[position].isspace():
+            position += 1
+        if position == len(buffer):
+            if eof:
+                yield None, 'Ошибка формата JSON: массив не закрыт'
+                return
+            chunk = stream.read(JSON_READ_SIZE)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        char = buffer[position]
+        if char == ']' and expected != 'item':
+            if not is_blank(buffer[position + 1:], stream):
+                yield None, 'Ошибка формата JSON: данные после массива'
+            return
+        if expected == 'separator_or_end':
+            if char != ',':
+                yield None, 'Ошибка формата JSON: ожидается , или ]'
+                return
+            position += 1
+            expected = 'item'
+            continue
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as error:
+            if eof:
+                yield None, f'Ошибка формата JSON: {error}'
+                return
+            end = len(buffer)
+        if end == len(buffer) and not eof:
+            # Элемент мог оборваться на границе прочитанной части.
+            chunk = stream.read(JSON_READ_SIZE)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        position = end
+        expected = 'separator_or_end'
+        yield item, None
+
+
+def iter_records(stream):
+    """Записи из JSON-массива или NDJSON (по значению JSON в строке).
+
+    Формат определяется по первому непробельному символу, оба формата
+    читаются потоком. Возвращает пары (запись, ошибка разбора). Данные
+    после массива и несколько значений в строке NDJSON - ошибка."""
+    first_char = skip_whitespace(stream)
+    if first_char == '[':
+        yield from iter_json_array(stream)
+        return
+    for line in chain([first_char + stream.readline()], stream):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line), None
+        except json.JSONDecodeError as error:
+            yield None, f'Ошибка формата JSON: {error}'
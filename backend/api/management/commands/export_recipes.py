@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.dumps import gzip_chunks, iter_dump, parse_since
+from foodgram_backend.constants import EXPORT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = ('Выгружает рецепты, избранное, списки покупок и подписки '
+            'в NDJSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-',
+                            help='Файл выгрузки, - для stdout.')
+        parser.add_argument('--since',
+                            help='Только данные, изменённые начиная с даты '
+                                 '(ISO 8601).')
+        parser.add_argument('--gzip', action='store_true',
+                            help='Сжать выгрузку gzip, требует --output.')
+        parser.add_argument('--chunk-size', type=int,
+                            default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = parse_since(options['since'])
+            except ValueError as error:
+                raise CommandError(error)
+        if options['gzip'] and options['output'] == '-':
+            raise CommandError('Для --gzip укажите файл в --output.')
+        lines = iter_dump(since, options['chunk_size'])
+        if options['output'] == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'wb') as file:
+            for chunk in self.encode(lines, options['gzip']):
+                file.write(chunk)
+
+    @staticmethod
+    def encode(lines, compress):
+        return (
+            gzip_chunks(lines) if compress
+            else (line.encode() for line in lines)
+        )
@@ -0,0 +1,58 @@
+import sys
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from api.imports import import_recipes
+from api.jsonstream import iter_records
+from foodgram_backend.constants import IMPORT_BATCH_SIZE, IMPORT_WORKERS
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Импортирует рецепты из JSON-массива или NDJSON '
+            '(по рецепту в строке) в формате API.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл с рецептами, - для stdin.')
+        parser.add_argument('--author', required=True,
+                            help='username или email автора рецептов.')
+        parser.add_argument('--batch-size', type=int,
+                            default=IMPORT_BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=IMPORT_WORKERS)
+
+    def handle(self, *args, **options):
+        author = User.objects.filter(
+            username=options['author']
+        ).first() or User.objects.filter(email=options['author']).first()
+        if author is None:
+            raise CommandError(
+                f'Пользователь не найден: {options["author"]}')
+        started = time.monotonic()
+        if options['path'] == '-':
+            report = self.import_file(sys.stdin, author, options)
+        else:
+            try:
+                with open(options['path'], encoding='utf-8') as file:
+                    report = self.import_file(file, author, options)
+            except FileNotFoundError:
+                raise CommandError(f'Файл не найден: {options["path"]}')
+        for error in report['errors']:
+            self.stdout.write(self.style.ERROR(
+                f'Запись {error["index"]}: {error["errors"]}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано рецептов: {report["created"]}, '
+            f'ошибок: {len(report["errors"])}, '
+            f'время: {time.monotonic() - started:.2f} с'
+        ))
+
+    @staticmethod
+    def import_file(file, author, options):
+        return import_recipes(
+            author,
+            iter_records(file),
+            batch_size=options['batch_size'],
+            workers=options['workers']
+        )
@@ -1,14 +1,246 @@
 """Пагинация API."""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from foodgram_backend.constants import (COUNT_QUERY_PARAM, CURSOR_QUERY_PARAM,
+                                        DEFAULT_PAGE_SIZE,
+                                        ESTIMATED_COUNT_MIN_ROWS,
+                                        PAGE_SIZE_MAX_LIMIT, PAGE_SIZE_PARAM,
+                                        PAGE_SIZE_QUERY_PARAM,
+                                        PAGINATION_COUNT_CACHE_TIMEOUT)
+
+
+def estimated_count(queryset):
+    """Количество строк таблицы без фильтров.
 
-from foodgram_backend.constants import (DEFAULT_PAGE_SIZE, PAGE_SIZE_MAX_LIMIT,
-                                        PAGE_SIZE_PARAM, PAGE_SIZE_QUERY_PARAM)
+    Значение берётся из кеша и обновляется раз в
+    PAGINATION_COUNT_CACHE_TIMEOUT секунд. На PostgreSQL для больших таблиц
+    используется оценка планировщика из pg_class.reltuples."""
+    model = queryset.model
+    cache_key = f'pagination_count:{model._meta.label_lower}'
+    count = cache.get(cache_key)
+    if count is not None:
+        return count
+    count = -1
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                [model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        count = row[0] if row else -1
+    if count < ESTIMATED_COUNT_MIN_ROWS:
+        count = queryset.count()
+    cache.set(cache_key, count, PAGINATION_COUNT_CACHE_TIMEOUT)
+    return count
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator, который для запросов без фильтров берёт приблизительное
+    количество строк, если включена настройка PAGINATION_ESTIMATED_COUNT."""
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if (settings.PAGINATION_ESTIMATED_COUNT and query is not None
+                and not query.where and not query.distinct):
+            return estimated_count(self.object_list)
+        return super().count
 
 
 class BaseLimitOffsetPagination(PageNumberPagination):
-    """Базовый класс пагинации."""
+    """Базовый класс пагинации.
+
+    С параметром count=false COUNT(*) не выполняется: выбирается на одну
+    строку больше страницы, а ответ содержит только next, previous
+    и results. Как и без count=false, пустая страница после первой даёт
+    404. page=last в этом режиме не поддерживается (номер последней
+    страницы неизвестен без COUNT(*)) и тоже даёт 404."""
 
+    django_paginator_class = EstimatedCountPaginator
     page_size = DEFAULT_PAGE_SIZE
     page_query_param = PAGE_SIZE_PARAM
     page_size_query_param = PAGE_SIZE_QUERY_PARAM
     max_page_size = PAGE_SIZE_MAX_LIMIT
+    count_query_param = COUNT_QUERY_PARAM
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count_free = (
+            request.query_params.get(self.count_query_param, '').lower()
+            == 'false'
+        )
+        if not self.count_free:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        page_size = self.get_page_size(request)
+        try:
+            self.page_number = int(
+                request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            self.page_number = 0
+        if self.page_number < 1:
+            raise NotFound(self.invalid_page_message)
+        offset = (self.page_number - 1) * page_size
+        rows = list(queryset[offset:offset + page_size + 1])
+        if not rows and self.page_number > 1:
+            raise NotFound(self.invalid_page_message)
+        self.has_next_page = len(rows) > page_size
+        return rows[:page_size]
+
+    def get_paginated_response(self, data):
+        if not self.count_free:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_count_free_link(self.page_number + 1)
+            if self.has_next_page else None,
+            'previous': self.get_count_free_link(self.page_number - 1)
+            if self.page_number > 1 else None,
+            'results': data,
+        })
+
+    def get_count_free_link(self, page_number):
+        url = self.request.build_absolute_uri()
+        if page_number == 1:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, page_number)
+
+
+class KeysetPagination(BaseLimitOffsetPagination):
+    """Пагинация с опциональным курсорным (keyset) режимом.
+
+    По умолчанию работает как BaseLimitOffsetPagination. Если в запросе
+    передан параметр cursor (для первой страницы - пустой), страница
+    выбирается условием по полям keyset_ordering без COUNT(*) и OFFSET,
+    а ответ содержит только next, previous и results."""
+
+    cursor_query_param = CURSOR_QUERY_PARAM
+    keyset_ordering = ()
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_mode = (
+            bool(self.keyset_ordering)
+            and self.cursor_query_param in request.query_params
+        )
+        if not self.keyset_mode:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        page_size = self.get_page_size(request)
+        values, reverse = self.decode_cursor(
+            request.query_params[self.cursor_query_param])
+        fields = [
+            (field.lstrip('-'), field.startswith('-'))
+            for field in self.keyset_ordering
+        ]
+        if values is not None:
+            try:
+                queryset = queryset.filter(
+                    self.keyset_filter(fields, values, reverse))
+            except (ValidationError, ValueError, TypeError):
+                raise NotFound(self.invalid_cursor_message)
+        queryset = queryset.order_by(*(
+            f'-{field}' if descending != reverse else field
+            for field, descending in fields
+        ))
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        self.next_cursor = self.previous_cursor = None
+        if rows and (has_more or reverse):
+            self.next_cursor = self.encode_cursor(rows[-1], fields, False)
+        if rows and (has_more if reverse else values is not None):
+            self.previous_cursor = self.encode_cursor(rows[0], fields, True)
+        return rows
+
+    def get_paginated_response(self, data):
+        if not self.keyset_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_cursor_link(self.next_cursor),
+            'previous': self.get_cursor_link(self.previous_cursor),
+            'results': data,
+        })
+
+    @staticmethod
+    def keyset_filter(fields, values, reverse):
+        """Условие "строго после курсора" для составного ключа."""
+        condition = Q()
+        equal = {}
+        for (field, descending), value in zip(fields, values):
+            lookup = 'lt' if descending != reverse else 'gt'
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return condition
+
+    @staticmethod
+    def encode_cursor(row, fields, reverse):
+        values = []
+        for field, _ in fields:
+            value = getattr(row, field)
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            values.append(value)
+        data = json.dumps({'v': values, 'r': reverse}).encode()
+        return urlsafe_b64encode(data).decode()
+
+    def decode_cursor(self, cursor):
+        """Возвращает значения ключа и направление, для первой страницы
+        значения - None."""
+        if not cursor:
+            return None, False
+        try:
+            data = json.loads(urlsafe_b64decode(cursor.encode()))
+            values, reverse = data['v'], bool(data['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if (not isinstance(values, list)
+                or len(values) != len(self.keyset_ordering)
+                or not all(self.is_key_value(value) for value in values)):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    @staticmethod
+    def is_key_value(value):
+        """Значения ключа в курсоре - строки (в том числе даты ISO 8601)
+        и целые числа."""
+        return (
+            isinstance(value, str)
+            or isinstance(value, int) and not isinstance(value, bool)
+        )
+
+    def get_cursor_link(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(
+            self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+
+class RecipePagination(KeysetPagination):
+    """Пагинация ленты рецептов."""
+
+    keyset_ordering = ('-created_at', '-id')
+
+
+class UserPagination(KeysetPagination):
+    """Пагинация списков пользователей."""
+
+    keyset_ordering = ('username', 'id')
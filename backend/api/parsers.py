@@ -0,0 +1,40 @@
+"""Парсеры тела запроса."""
+import codecs
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from .jsonstream import iter_json_array, iter_records, skip_whitespace
+
+
+def get_text_stream(stream, parser_context):
+    encoding = (parser_context or {}).get(
+        'encoding', settings.DEFAULT_CHARSET)
+    return codecs.getreader(encoding)(stream)
+
+
+class JSONArrayParser(BaseParser):
+    """JSON-массив, который читается по элементам.
+
+    Результат - итератор пар (элемент, ошибка разбора)."""
+
+    media_type = 'application/json'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        stream = get_text_stream(stream, parser_context)
+        if skip_whitespace(stream) != '[':
+            raise ParseError('Ожидается массив рецептов или NDJSON.')
+        return iter_json_array(stream)
+
+
+class NDJSONParser(BaseParser):
+    """NDJSON: по объекту JSON в строке.
+
+    Тело читается лениво, результат - итератор пар (запись, ошибка
+    разбора)."""
+
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return iter_records(get_text_stream(stream, parser_context))
@@ -0,0 +1,42 @@
+"""Справочники, которые хранятся в памяти процесса."""
+from recipes.models import Tag
+
+from .cache import TAGS_NAMESPACE, ProcessLocalValue, make_etag
+
+
+class TagRegistry:
+    """Все теги по id и по slug.
+
+    Теги меняются редко, поэтому список тегов, фильтр рецептов по slug и
+    проверка тегов при создании рецепта обходятся без запросов к БД."""
+
+    def __init__(self, tags):
+        self.tags = tags
+        self.by_id = {tag.id: tag for tag in tags}
+        self.by_slug = {tag.slug: tag for tag in tags}
+        self.etags = {
+            tag.id: self.make_etag([tag]) for tag in tags
+        }
+        self.etag = self.make_etag(tags)
+
+    @staticmethod
+    def make_etag(tags):
+        return make_etag(*(
+            (tag.id, tag.name, tag.slug, tag.created_at.isoformat())
+            for tag in tags
+        ))
+
+    def slug_choices(self):
+        return [(tag.slug, tag.name) for tag in self.tags]
+
+
+tag_registry = ProcessLocalValue(lambda: TagRegistry(list(Tag.objects.all())))
+
+
+def get_tag_registry():
+    """Справочник тегов, перестраиваемый после изменения тегов."""
+    return tag_registry.get((TAGS_NAMESPACE,))
+
+
+def tag_slug_choices():
+    return get_tag_registry().slug_choices()
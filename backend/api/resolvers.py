@@ -0,0 +1,64 @@
+"""Данные, которые загружаются один раз за запрос."""
+from users.models import Subscription
+
+
+class SubscriptionResolver:
+    """Подписки текущего пользователя в рамках одного запроса.
+
+    Множество id авторов загружается одним запросом при первом обращении,
+    далее все сериализаторы отвечают из памяти. Здесь же хранятся уже
+    готовые представления пользователей, чтобы повторяющийся автор
+    сериализовался один раз."""
+
+    request_attr = '_subscription_resolver'
+
+    def __init__(self, user):
+        self.user = user
+        self._author_ids = None
+        # Подписки, созданные и удалённые в текущем запросе.
+        self.changes = {}
+        self.representations = {}
+
+    @classmethod
+    def for_request(cls, request):
+        """Возвращает резолвер, привязанный к запросу."""
+        resolver = getattr(request, cls.request_attr, None)
+        if resolver is None:
+            resolver = cls(request.user)
+            setattr(request, cls.request_attr, resolver)
+        return resolver
+
+    @property
+    def author_ids(self):
+        if self._author_ids is None:
+            if self.user.is_authenticated:
+                self._author_ids = set(
+                    Subscription.objects
+                    .filter(subscriber=self.user)
+                    .values_list('user_id', flat=True)
+                )
+            else:
+                self._author_ids = set()
+        return self._author_ids
+
+    def is_subscribed(self, author_id):
+        if author_id == self.user.id:
+            # Подписка на самого себя запрещена ограничением БД.
+            return False
+        if author_id in self.changes:
+            return self.changes[author_id]
+        return author_id in self.author_ids
+
+    def add(self, author_id):
+        """Учитываем подписку, созданную в текущем запросе."""
+        if self._author_ids is not None:
+            self._author_ids.add(author_id)
+        self.changes[author_id] = True
+        self.representations.clear()
+
+    def discard(self, author_id):
+        """Учитываем подписку, удалённую в текущем запросе."""
+        if self._author_ids is not None:
+            self._author_ids.discard(author_id)
+        self.changes[author_id] = False
+        self.representations.clear()
@@ -1,9 +1,13 @@
 """Сериализаторы."""
 import base64
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.base import ContentFile
-from django.db import transaction
+from django.db import models, transaction
+from django.db.models import F, Prefetch, Window, prefetch_related_objects
+from django.db.models.functions import RowNumber
 from djoser.serializers import UserCreateSerializer
 from djoser.serializers import UserSerializer as DjoserUserSerializer
 from rest_framework import serializers
@@ -13,14 +17,44 @@ from foodgram_backend.constants import (AMOUNT_INGREDIENT_FIELD_MAX,
                                         BASE_RECIPES_LIMIT_SUBSCRIPTION,
                                         BATCH_SIZE, COOKING_TIME_FIELD_MAX,
                                         COOKING_TIME_FIELD_MIN)
-from recipes.models import (Favorites, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingList, Tag)
-from users.models import Subscription
-
+from recipes.carts import apply_cart_deltas, manual_cart_deltas
+from recipes.models import (Ingredient, Recipe, RecipeIngredient, ShoppingList,
+                            Tag)
+from recipes.search import render_snippet
+
+from .cache import (INGREDIENTS_NAMESPACE, TAGS_NAMESPACE, USERS_NAMESPACE,
+                    get_cache_versions)
+from .registries import get_tag_registry
+from .resolvers import SubscriptionResolver
 from .validators import validate_unique_data
 
 User = get_user_model()
 
+# Связанные данные, которые выводит RecipeSerializer. Ингредиенты и теги
+# кладутся в списки to_attr, которые create и update заполняют сами.
+RECIPE_READ_PREFETCH = (
+    'author',
+    Prefetch(
+        'recipe_ingredient',
+        queryset=RecipeIngredient.objects.select_related('ingredient'),
+        to_attr='prefetched_ingredients'
+    ),
+    Prefetch('tags', to_attr='prefetched_tags'),
+)
+
+
+def set_prefetched(instance, to_attr, objects):
+    """Кладёт уже загруженные объекты связи в атрибут to_attr, как
+    Prefetch(to_attr=...), в порядке Meta.ordering их модели."""
+    objects = list(objects)
+    if objects:
+        meta = type(objects[0])._meta
+        for field in reversed(meta.ordering):
+            attname = meta.get_field(field.lstrip('-')).attname
+            objects.sort(key=lambda obj: getattr(obj, attname),
+                         reverse=field.startswith('-'))
+    setattr(instance, to_attr, objects)
+
 
 class Base64ImageField(serializers.ImageField):
     """Сериализатор для картинки Base64."""
@@ -55,12 +89,20 @@ class UserSerializer(DjoserUserSerializer):
                   'is_subscribed', 'avatar',)
         model = User
 
+    def to_representation(self, instance):
+        """Один и тот же пользователь сериализуется один раз за запрос."""
+        representations = SubscriptionResolver.for_request(
+            self.context['request']).representations
+        key = (type(self), instance.pk)
+        if key not in representations:
+            representations[key] = super().to_representation(instance)
+        return representations[key]
+
     def get_is_subscribed(self, obj):
-        current_user = self.context['request'].user
+        request = self.context['request']
         return (
-            current_user.id
-            and Subscription.objects.filter(
-                subscriber=current_user, user=obj).exists()
+            request.user.id
+            and SubscriptionResolver.for_request(request).is_subscribed(obj.id)
         )
 
     def get_avatar(self, obj):
@@ -105,9 +147,47 @@ class IngredientSerializer(serializers.ModelSerializer):
         model = Ingredient
 
 
+class PrimaryKeyField(serializers.PrimaryKeyRelatedField):
+    """Первичный ключ без обращения к БД.
+
+    Проверяется только тип значения, объекты одним запросом загружает
+    родительское поле или сериализатор."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+def format_missing_ids(name, ids):
+    return f'{name} с id {", ".join(map(str, sorted(ids)))} не найдены.'
+
+
+class RecipeIngredientListSerializer(serializers.ListSerializer):
+    """Ингредиенты рецепта загружаются одним запросом по всем id."""
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        ids = {item['ingredient'] for item in items}
+        # Импорт передаёт ингредиенты всей пачки рецептов в контексте.
+        ingredients = self.context.get('ingredients')
+        if ingredients is None:
+            ingredients = Ingredient.objects.in_bulk(ids)
+        missing = ids - ingredients.keys()
+        if missing:
+            raise serializers.ValidationError(
+                format_missing_ids('Ингридиенты', missing))
+        for item in items:
+            item['ingredient'] = ingredients[item['ingredient']]
+        return items
+
+
 class ShortRecipeIngredientSerializer(serializers.ModelSerializer):
     """Не полный Сериализатор для модели RecipeIngredient."""
-    id = serializers.PrimaryKeyRelatedField(
+    id = PrimaryKeyField(
         queryset=Ingredient.objects.all(),
         source='ingredient'
     )
@@ -119,6 +199,7 @@ class ShortRecipeIngredientSerializer(serializers.ModelSerializer):
     class Meta:
         model = RecipeIngredient
         fields = ['id', 'amount']
+        list_serializer_class = RecipeIngredientListSerializer
 
 
 class FullRecipeIngredientSerializer(serializers.ModelSerializer):
@@ -139,11 +220,23 @@ class FullRecipeIngredientSerializer(serializers.ModelSerializer):
         model = RecipeIngredient
 
 
+class TagRegistryField(serializers.ManyRelatedField):
+    """Теги по первичным ключам из справочника в памяти процесса."""
+
+    def to_internal_value(self, data):
+        ids = super().to_internal_value(data)
+        by_id = self.context.get('tags') or get_tag_registry().by_id
+        missing = set(ids) - by_id.keys()
+        if missing:
+            raise serializers.ValidationError(
+                format_missing_ids('Теги', missing))
+        return [by_id[tag_id] for tag_id in ids]
+
+
 class RecipeCreateSerializer(serializers.ModelSerializer):
     """Сериализатор для модели Recipe. Create action."""
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True
+    tags = TagRegistryField(
+        child_relation=PrimaryKeyField(queryset=Tag.objects.all())
     )
     image = Base64ImageField(required=True, allow_null=False)
     ingredients = ShortRecipeIngredientSerializer(
@@ -175,7 +268,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
     def create_ingredients(ingredients: list, recipe,
                            batch_size=BATCH_SIZE):
         """Создание ингредиентов с помощью bulk_create."""
-        RecipeIngredient.objects.bulk_create(
+        return RecipeIngredient.objects.bulk_create(
             [
                 RecipeIngredient(
                     recipe=recipe,
@@ -192,34 +285,167 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         ingredients = validated_data.pop('recipe_ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
-        self.create_ingredients(ingredients, recipe)
+        recipe_ingredients = self.create_ingredients(ingredients, recipe)
         recipe.tags.set(tags)
+        set_prefetched(recipe, 'prefetched_tags', tags)
+        set_prefetched(recipe, 'prefetched_ingredients', recipe_ingredients)
+        recipe.is_favorited = recipe.is_in_shopping_cart = False
         return recipe
 
     @transaction.atomic()
     def update(self, instance, validated_data):
-        """Обновление полей при запросе PATCH."""
-        tags = validated_data.pop('tags', instance.tags)
-        instance.tags.set(tags)
+        """Обновление полей при запросе PATCH.
+
+        Теги и ингредиенты сравниваются с сохранёнными, в БД пишутся
+        только изменения."""
+        tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('recipe_ingredients', None)
         instance = super().update(instance, validated_data)
-        instance.recipe_ingredient.all().delete()
-        self.create_ingredients(ingredients, instance)
+        if tags is not None:
+            self.update_tags(instance, tags)
+            set_prefetched(instance, 'prefetched_tags', tags)
+        if ingredients is not None:
+            set_prefetched(
+                instance, 'prefetched_ingredients',
+                self.update_ingredients(instance, ingredients)
+            )
         return instance
 
+    @staticmethod
+    def update_tags(recipe, tags):
+        old_ids = set(recipe.tags.values_list('id', flat=True))
+        new_ids = {tag.id for tag in tags}
+        if old_ids - new_ids:
+            recipe.tags.remove(*(old_ids - new_ids))
+        if new_ids - old_ids:
+            recipe.tags.add(*(new_ids - old_ids))
+
+    @staticmethod
+    def update_ingredients(recipe, ingredients, batch_size=BATCH_SIZE):
+        """Вставляет новые, обновляет изменённые и удаляет убранные
+        ингредиенты рецепта.
+
+        Возвращает ингредиенты рецепта после изменения."""
+        old_rows = {
+            ingredient_id: (pk, amount)
+            for pk, ingredient_id, amount in
+            recipe.recipe_ingredient.values_list(
+                'id', 'ingredient_id', 'amount')
+        }
+        new_amounts = {
+            ingredient['ingredient'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        rows = []
+        created = []
+        updated = []
+        for ingredient in ingredients:
+            ingredient_id = ingredient['ingredient'].id
+            row = RecipeIngredient(
+                recipe=recipe, ingredient=ingredient['ingredient'],
+                amount=ingredient['amount'])
+            rows.append(row)
+            if ingredient_id not in old_rows:
+                created.append(row)
+                continue
+            row.id, old_amount = old_rows[ingredient_id]
+            if old_amount != row.amount:
+                updated.append(row)
+        deleted = [
+            pk for ingredient_id, (pk, _) in old_rows.items()
+            if ingredient_id not in new_amounts
+        ]
+        if created:
+            RecipeIngredient.objects.bulk_create(
+                created, batch_size=batch_size)
+        if updated:
+            RecipeIngredient.objects.bulk_update(
+                updated, ['amount'], batch_size=batch_size)
+        if deleted:
+            with manual_cart_deltas():
+                RecipeIngredient.objects.filter(id__in=deleted).delete()
+        deltas = {
+            ingredient_id: new_amounts.get(ingredient_id, 0) - amount
+            for ingredient_id, (_, amount) in old_rows.items()
+        }
+        for ingredient_id, amount in new_amounts.items():
+            deltas.setdefault(ingredient_id, amount)
+        if any(deltas.values()):
+            apply_cart_deltas(
+                ShoppingList.objects
+                .filter(recipe=recipe)
+                .values_list('user_id', flat=True),
+                deltas
+            )
+        return rows
+
     def to_representation(self, instance):
-        """Возвращаем рецепт с ингредиентами в нужном формате."""
-        return RecipeSerializer(
-            instance=instance, context=self.context).data
+        """Возвращаем рецепт в формате RecipeSerializer.
+
+        Теги, ингредиенты и флаги после create и update уже лежат в
+        объекте рецепта, поэтому ответ собирается без запросов к БД."""
+        serializer = RecipeSerializer(context=self.context)
+        return serializer.merge_user_fields(
+            serializer.get_fragment(instance), instance)
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """Список рецептов из закешированных фрагментов.
+
+    Общая для всех пользователей часть рецепта хранится в кеше по id и
+    updated_at рецепта, связанные данные загружаются только для рецептов,
+    которых нет в кеше. Поля текущего пользователя добавляются при каждом
+    ответе."""
+
+    def to_representation(self, data):
+        recipes = list(
+            data.all() if isinstance(data, models.manager.BaseManager)
+            else data
+        )
+        fragments = self.get_fragments(recipes)
+        return [
+            self.child.merge_user_fields(fragments[recipe.pk], recipe)
+            for recipe in recipes
+        ]
+
+    def get_fragments(self, recipes):
+        """Фрагменты рецептов по id: из кеша или построенные заново."""
+        if not settings.RECIPE_FRAGMENT_CACHE:
+            return self.build_fragments(recipes)
+        versions = get_cache_versions(
+            TAGS_NAMESPACE, INGREDIENTS_NAMESPACE, USERS_NAMESPACE)
+        keys = {
+            recipe.pk: (f'recipe_fragment:{versions}:{recipe.pk}:'
+                        f'{recipe.updated_at.timestamp()}')
+            for recipe in recipes
+        }
+        cached = cache.get_many(keys.values())
+        fragments = {
+            pk: cached[key] for pk, key in keys.items() if key in cached
+        }
+        missed = [recipe for recipe in recipes if recipe.pk not in fragments]
+        if missed:
+            new_fragments = self.build_fragments(missed)
+            cache.set_many(
+                {keys[pk]: fragment for pk, fragment in new_fragments.items()},
+                settings.RECIPE_FRAGMENT_TIMEOUT
+            )
+            fragments.update(new_fragments)
+        return fragments
+
+    def build_fragments(self, recipes):
+        prefetch_related_objects(recipes, *RECIPE_READ_PREFETCH)
+        return {recipe.pk: self.child.get_fragment(recipe)
+                for recipe in recipes}
 
 
 class RecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для модели Recipe."""
 
     ingredients = FullRecipeIngredientSerializer(
-        source='recipe_ingredient', many=True, read_only=True)
+        source='prefetched_ingredients', many=True, read_only=True)
     author = UserSerializer(read_only=True)
-    tags = TagSerializer(many=True, read_only=True)
+    tags = TagSerializer(source='prefetched_tags', many=True, read_only=True)
 
     image = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
@@ -230,8 +456,49 @@ class RecipeSerializer(serializers.ModelSerializer):
                   'is_in_shopping_cart', 'name', 'image', 'text',
                   'cooking_time')
         model = Recipe
+        list_serializer_class = RecipeListSerializer
+
+    def to_representation(self, instance):
+        # Рецепт, загруженный без RECIPE_READ_PREFETCH.
+        prefetch_related_objects([instance], *RECIPE_READ_PREFETCH)
+        return super().to_representation(instance)
+
+    def get_fragment(self, obj):
+        """Представление рецепта без полей текущего пользователя."""
+        data = self.to_representation(obj)
+        del data['is_favorited'], data['is_in_shopping_cart']
+        data['author'] = {
+            field: value for field, value in data['author'].items()
+            if field != 'is_subscribed'
+        }
+        return data
+
+    def merge_user_fields(self, fragment, obj):
+        """Дополняет фрагмент полями текущего пользователя."""
+        author = {
+            field: fragment['author'].get(field)
+            for field in self.fields['author'].Meta.fields
+        }
+        request = self.context['request']
+        author['is_subscribed'] = (
+            request.user.id
+            and SubscriptionResolver.for_request(request).is_subscribed(
+                obj.author_id)
+        )
+        data = {field: fragment.get(field) for field in self.Meta.fields}
+        data.update(
+            author=author,
+            is_favorited=self.get_is_favorited(obj),
+            is_in_shopping_cart=self.get_is_in_shopping_cart(obj)
+        )
+        if hasattr(obj, 'search_snippet'):
+            # Фрагмент зависит от запроса и не попадает в кеш фрагментов.
+            data['search_snippet'] = render_snippet(obj.search_snippet)
+        return data
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request', None)
         return (
             request
@@ -240,6 +507,8 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request', None)
         return (
             request
@@ -254,8 +523,8 @@ class RecipeSerializer(serializers.ModelSerializer):
 
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
-    """Сериализатор модели Recipe для ShoppingListSerializer и
-    FavoritesSerializer."""
+    """Сериализатор модели Recipe для ответов избранного, списка покупок
+    и подписок."""
 
     image = serializers.SerializerMethodField()
 
@@ -269,42 +538,19 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
         return None
 
 
-class ShoppingListSerializer(serializers.ModelSerializer):
-    """Сериализатор для модели ShoppingList."""
-
-    class Meta:
-        fields = ('user', 'recipe')
-        model = ShoppingList
-
-    def to_representation(self, instance):
-        return ShortRecipeSerializer(instance.recipe).data
-
-
-class FavoritesSerializer(serializers.ModelSerializer):
-    """Сериализатор для модели Favorites."""
-
-    class Meta:
-        fields = ('user', 'recipe')
-        model = Favorites
-
-    def to_representation(self, instance):
-        return ShortRecipeSerializer(instance.recipe).data
-
-
 class SubscriptionSerializer(UserSerializer):
     """Сериализатор для отображения подписок."""
 
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
 
     class Meta(UserSerializer.Meta):
         fields = ('email', 'id', 'username', 'first_name', 'last_name',
                   'is_subscribed', 'recipes', 'recipes_count', 'avatar')
         model = User
 
-    def get_recipes_limit(self):
+    @staticmethod
+    def get_recipes_limit(request):
         """Устанавливаем лимит для рецептов."""
-        request = self.context.get('request')
         limit = BASE_RECIPES_LIMIT_SUBSCRIPTION
         if not request:
             return limit
@@ -313,29 +559,25 @@ class SubscriptionSerializer(UserSerializer):
         except (ValueError, TypeError):
             return limit
 
+    @staticmethod
+    def prefetch_recipes(queryset, recipes_limit):
+        """Первые recipes_limit рецептов каждого автора одним запросом."""
+        recipes = Recipe.objects.annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=F('author'),
+                order_by=(F('created_at').desc(), F('id').desc())
+            )
+        ).filter(row_number__lte=recipes_limit)
+        return queryset.prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='limited_recipes'))
+
     def get_recipes(self, obj):
-        recipes_limit = self.get_recipes_limit()
-        recipes = obj.recipes.all()[:recipes_limit]
+        if hasattr(obj, 'limited_recipes'):
+            recipes = obj.limited_recipes
+        else:
+            recipes_limit = self.get_recipes_limit(
+                self.context.get('request'))
+            recipes = obj.recipes.all()[:recipes_limit]
 
         return ShortRecipeSerializer(recipes, many=True).data
-
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
-
-class SubscriptionCreateSerializer(serializers.ModelSerializer):
-    """Сериализатор для модели Subscription."""
-
-    class Meta:
-        fields = ('subscriber', 'user')
-        model = Subscription
-
-    def validate(self, data):
-        if data.get('subscriber') == data.get('user'):
-            raise serializers.ValidationError(
-                'Нельзя подписаться на самого себя.')
-        return data
-
-    def to_representation(self, instance):
-        return SubscriptionSerializer(
-            instance.user, context=self.context).data
@@ -0,0 +1,97 @@
+"""Сигналы инвалидации кеша API."""
+from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+
+from recipes.carts import carts_changed
+from recipes.models import (Favorites, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingList, Tag, recipes_touched)
+from users.models import Subscription
+
+from .cache import (INGREDIENTS_NAMESPACE, RECIPES_NAMESPACE, TAGS_NAMESPACE,
+                    USERS_NAMESPACE, bump_cache_version, user_namespace)
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(recipes_touched, sender=Recipe)
+def invalidate_recipes(sender, **kwargs):
+    bump_cache_version(RECIPES_NAMESPACE)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tags(sender, **kwargs):
+    bump_cache_version(TAGS_NAMESPACE)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredients(sender, **kwargs):
+    bump_cache_version(INGREDIENTS_NAMESPACE)
+
+
+# Поля пользователя, которые попадают в закешированные рецепты как данные
+# автора. Рецепты удалённого пользователя удаляются вместе с ним и меняют
+# версию RECIPES_NAMESPACE.
+AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name', 'avatar')
+
+
+@receiver(pre_save, sender=User)
+def remember_author_fields(sender, instance, raw, update_fields=None,
+                           **kwargs):
+    instance._author_fields = None
+    if raw or instance.pk is None:
+        return
+    fields = [
+        field for field in AUTHOR_FIELDS
+        if update_fields is None or field in update_fields
+    ]
+    if not fields:
+        return
+    values = (
+        User.objects
+        .filter(pk=instance.pk)
+        .filter(Exists(Recipe.objects.filter(author=OuterRef('pk'))))
+        .values_list(*fields)
+        .first()
+    )
+    if values is not None:
+        instance._author_fields = fields, values
+
+
+@receiver(post_save, sender=User)
+def invalidate_users(sender, instance, **kwargs):
+    # Сбрасываем кеш, только если изменились данные автора рецептов.
+    author_fields = instance.__dict__.pop('_author_fields', None)
+    if author_fields is None:
+        return
+    fields, values = author_fields
+    if values != tuple(getattr(instance, field) for field in fields):
+        bump_cache_version(USERS_NAMESPACE)
+
+
+@receiver(post_save, sender=Favorites)
+@receiver(post_delete, sender=Favorites)
+@receiver(post_save, sender=ShoppingList)
+@receiver(post_delete, sender=ShoppingList)
+def invalidate_user_recipes(sender, instance, **kwargs):
+    bump_cache_version(user_namespace(instance.user_id))
+
+
+@receiver(carts_changed)
+def invalidate_carts(sender, user_ids, **kwargs):
+    bump_cache_version(*map(user_namespace, user_ids))
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_user_subscriptions(sender, instance, **kwargs):
+    bump_cache_version(user_namespace(instance.subscriber_id))
@@ -0,0 +1,90 @@
+"""Снимок каталога ингредиентов.
+
+Полный список ингредиентов хранится готовым JSON вместе со сжатыми
+gzip и brotli вариантами и отдаётся
+со строгим ETag."""
+import gzip
+import os
+import re
+from hashlib import sha256
+from pathlib import Path
+
+import brotli
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from rest_framework.renderers import JSONRenderer
+
+from recipes.models import Ingredient
+
+from .cache import INGREDIENTS_NAMESPACE, ProcessLocalValue
+
+SNAPSHOT_FILE_NAME = 'ingredients.json'
+ACCEPT_ENCODING_RE = {
+    'br': re.compile(r'\bbr\b'),
+    'gzip': re.compile(r'\bgzip\b'),
+}
+
+
+class CatalogSnapshot:
+    """Тело ответа и его сжатые варианты."""
+
+    def __init__(self, body):
+        self.etag = f'"{sha256(body).hexdigest()}"'
+        self.bodies = {
+            None: body,
+            'gzip': gzip.compress(body, mtime=0),
+            'br': brotli.compress(body),
+        }
+
+    def write(self, directory):
+        """Сохраняет варианты в directory, чтобы их мог отдавать nginx
+        (gzip_static, brotli_static)."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        suffixes = {None: '', 'gzip': '.gz', 'br': '.br'}
+        for encoding, body in self.bodies.items():
+            path = directory / f'{SNAPSHOT_FILE_NAME}{suffixes[encoding]}'
+            temp_path = path.with_name(f'.{path.name}.{os.getpid()}')
+            temp_path.write_bytes(body)
+            os.replace(temp_path, path)
+
+    def get_response(self, request):
+        """Ответ 304 при совпадении If-None-Match, иначе подходящий по
+        Accept-Encoding вариант."""
+        not_modified = get_conditional_response(request, etag=self.etag)
+        if not_modified is not None:
+            not_modified['ETag'] = self.etag
+            return not_modified
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        encoding = next(
+            (
+                encoding for encoding in ('br', 'gzip')
+                if encoding in self.bodies
+                and ACCEPT_ENCODING_RE[encoding].search(accept_encoding)
+            ),
+            None
+        )
+        response = HttpResponse(
+            self.bodies[encoding], content_type='application/json')
+        response['ETag'] = self.etag
+        response['Vary'] = 'Accept-Encoding'
+        if encoding:
+            response['Content-Encoding'] = encoding
+        return response
+
+
+def build_ingredient_snapshot(serializer_class):
+    snapshot = CatalogSnapshot(JSONRenderer().render(
+        serializer_class(Ingredient.objects.all(), many=True).data))
+    if settings.INGREDIENTS_SNAPSHOT_DIR:
+        snapshot.write(settings.INGREDIENTS_SNAPSHOT_DIR)
+    return snapshot
+
+
+ingredient_snapshot = ProcessLocalValue(build_ingredient_snapshot)
+
+
+def get_ingredient_snapshot(serializer_class):
+    """Снимок, перестраиваемый после изменения ингредиентов."""
+    return ingredient_snapshot.get((INGREDIENTS_NAMESPACE,), serializer_class)
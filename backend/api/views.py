@@ -1,37 +1,63 @@
 """Вьюсеты."""
+from functools import partial
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http.response import HttpResponse
+from django.db.models import Exists, F, OuterRef
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
+from django.utils.cache import patch_vary_headers
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import (IsAuthenticated,
+from rest_framework.permissions import (IsAdminUser, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.validators import UniqueTogetherValidator
 
-from recipes.models import (Favorites, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingList, Tag)
+from foodgram_backend.constants import SHOPPING_LIST_CHUNK_SIZE
+from recipes.models import (Favorites, Ingredient, Recipe,
+                            ShoppingCartIngredient, ShoppingList, Tag)
 from users.models import Subscription
 
+from .autocomplete import get_ingredient_index
+from .cache import (INGREDIENTS_NAMESPACE, RECIPES_NAMESPACE, TAGS_NAMESPACE,
+                    USERS_NAMESPACE, AnonymousResponseCacheMixin,
+                    conditional_response, get_cache_versions, make_etag,
+                    user_namespace)
+from .dumps import gzip_chunks, iter_dump, parse_since
+from .exports import (SHOPPING_LIST_FORMATS, IgnoreFormatContentNegotiation,
+                      shopping_list_response)
+from .fast_serializers import FastRecipeSerializer
 from .filters import IngredientFilter, RecipeFilter
-from .pagination import BaseLimitOffsetPagination
+from .imports import import_recipes
+from .pagination import RecipePagination, UserPagination
+from .parsers import JSONArrayParser, NDJSONParser
 from .permissions import IsAdminOrReadOnly, IsAuthorOrReadOnly
-from .serializers import (AvatarSerializer, FavoritesSerializer,
+from .registries import get_tag_registry
+from .resolvers import SubscriptionResolver
+from .serializers import (RECIPE_READ_PREFETCH, AvatarSerializer,
                           IngredientSerializer, RecipeCreateSerializer,
-                          RecipeSerializer, ShoppingListSerializer,
-                          SubscriptionCreateSerializer, SubscriptionSerializer,
-                          TagSerializer)
+                          RecipeSerializer, ShortRecipeSerializer,
+                          SubscriptionSerializer, TagSerializer)
+from .snapshots import get_ingredient_snapshot
+from .writes import (add_relation, add_user_recipe, remove_relation,
+                     remove_user_recipe)
 
 User = get_user_model()
 
+RECIPE_NOT_FOUND = f'No {Recipe._meta.object_name} matches the given query.'
+USER_NOT_FOUND = f'No {User._meta.object_name} matches the given query.'
+SELF_SUBSCRIPTION = 'Нельзя подписаться на самого себя.'
+
 
 class UsersViewSet(UserViewSet):
     """ViewSet для модели Users."""
 
     queryset = User.objects.all()
-    pagination_class = BaseLimitOffsetPagination
+    pagination_class = UserPagination
     http_method_names = ('get', 'post', 'put', 'delete')
     permission_classes = (IsAdminOrReadOnly, IsAuthorOrReadOnly)
 
@@ -60,9 +86,10 @@ class UsersViewSet(UserViewSet):
             permission_classes=[IsAuthenticated])
     def subscribtions(self, request, *args, **kwargs):
         """Action для отображения подписок пользователя."""
-        user = User.objects.filter(
-            subscriptions__subscriber=request.user
-        ).prefetch_related('recipes')
+        user = SubscriptionSerializer.prefetch_recipes(
+            User.objects.filter(subscriptions__subscriber=request.user),
+            SubscriptionSerializer.get_recipes_limit(request)
+        )
         page = self.paginate_queryset(user)
         serializer = SubscriptionSerializer(
             page, many=True, context={'request': request})
@@ -71,53 +98,220 @@ class UsersViewSet(UserViewSet):
     @action(detail=True, methods=['post', 'delete'], url_path='subscribe',
             permission_classes=[IsAuthenticated])
     def subscribe(self, request, *args, **kwargs):
-        """Action для подписки и отписки на пользователя."""
-        user = self.get_object()
-        if self.request.method == 'POST':
-            serializer = SubscriptionCreateSerializer(
-                data={'user': user.id, 'subscriber': request.user.id},
-                context={'request': request}
+        """Action для подписки и отписки на пользователя.
+
+        Подписка создаётся одним запросом с опорой на ограничения
+        unique_subscription и unique_subscriber, ответ собирается так же,
+        как список подписок."""
+        try:
+            author_id = int(kwargs[self.lookup_field])
+        except ValueError:
+            raise Http404(USER_NOT_FOUND)
+        resolver = SubscriptionResolver.for_request(request)
+        if self.request.method == 'DELETE':
+            if remove_relation(Subscription, 'subscriber', 'user',
+                               request.user.id, author_id):
+                resolver.discard(author_id)
+                return Response(status=status.HTTP_204_NO_CONTENT)
+            if not User.objects.filter(pk=author_id).exists():
+                raise Http404(USER_NOT_FOUND)
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        if author_id == request.user.id:
+            return Response(
+                {api_settings.NON_FIELD_ERRORS_KEY: [SELF_SUBSCRIPTION]},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        deleted, _ = Subscription.objects.filter(
-            user=user,
-            subscriber=request.user
-        ).delete()
-        if deleted:
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+        created = add_relation(Subscription, 'subscriber', 'user',
+                               request.user.id, author_id)
+        if created:
+            resolver.add(author_id)
+        author = SubscriptionSerializer.prefetch_recipes(
+            User.objects.filter(pk=author_id),
+            SubscriptionSerializer.get_recipes_limit(request)
+        ).first()
+        if author is None:
+            raise Http404(USER_NOT_FOUND)
+        if not created:
+            return Response(
+                {api_settings.NON_FIELD_ERRORS_KEY: [
+                    UniqueTogetherValidator.message.format(
+                        field_names='subscriber, user')
+                ]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = SubscriptionSerializer(
+            author, context=self.get_serializer_context())
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
-    """ViewSet для модели Tag"""
+    """ViewSet для модели Tag. Теги отдаются из справочника в памяти
+    процесса с поддержкой условного GET."""
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
 
+    def list(self, request, *args, **kwargs):
+        registry = get_tag_registry()
+        return conditional_response(
+            request,
+            lambda: Response(
+                self.get_serializer(registry.tags, many=True).data),
+            registry.etag
+        )
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+    def retrieve(self, request, *args, **kwargs):
+        registry = get_tag_registry()
+        try:
+            tag = registry.by_id[int(kwargs['pk'])]
+        except (KeyError, ValueError):
+            raise Http404
+        return conditional_response(
+            request,
+            lambda: Response(self.get_serializer(tag).data),
+            registry.etags[tag.id]
+        )
+
+
+class IngredientViewSet(AnonymousResponseCacheMixin,
+                        viewsets.ReadOnlyModelViewSet):
     """ViewSet для модели Tag"""
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
+    cache_dependencies = (INGREDIENTS_NAMESPACE,)
+
+    def list(self, request, *args, **kwargs):
+        """Полный каталог отдаётся готовым снимком, поиск по названию
+        отвечает из индекса в памяти процесса."""
+        if not request.query_params and settings.INGREDIENTS_SNAPSHOT:
+            return get_ingredient_snapshot(
+                self.get_serializer_class()).get_response(request)
+        name = request.query_params.get('name')
+        if name and settings.INGREDIENT_AUTOCOMPLETE:
+            index = get_ingredient_index(self.get_serializer_class())
+            return Response(index.search(name))
+        return super().list(request, *args, **kwargs)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AnonymousResponseCacheMixin, viewsets.ModelViewSet):
     """ViewSet для модели Recipe"""
-    queryset = (
-        Recipe.objects
-        .select_related('author')
-        .prefetch_related('ingredients', 'tags')
-    )
+    queryset = Recipe.objects.all()
     permission_classes = (IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly)
-    pagination_class = BaseLimitOffsetPagination
+    pagination_class = RecipePagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     http_method_names = ('get', 'post', 'patch', 'delete')
+    cache_dependencies = (RECIPES_NAMESPACE, TAGS_NAMESPACE,
+                          INGREDIENTS_NAMESPACE, USERS_NAMESPACE)
+    # Для списка связанные данные загружает RecipeListSerializer только
+    # для рецептов, которых нет в кеше фрагментов.
+    list_plan = {
+        'user_flags': True,
+    }
+    read_plan = {
+        'prefetch_related': RECIPE_READ_PREFETCH,
+        'user_flags': True,
+    }
+    short_plan = {
+        'only': ('id', 'link'),
+    }
+    # Ответ на изменение собирается из объектов в памяти, автор и флаги
+    # загружаются вместе с рецептом.
+    write_plan = {
+        'select_related': ('author',),
+        'user_flags': True,
+    }
+    # План загрузки связанных данных для каждого action.
+    # Action без плана получают рецепт без связанных данных.
+    action_plans = {
+        'list': list_plan,
+        'retrieve': read_plan,
+        'partial_update': write_plan,
+        'get_short_link': short_plan,
+    }
+
+    def get_queryset(self):
+        """Собираем queryset по плану текущего action."""
+        queryset = super().get_queryset()
+        plan = self.action_plans.get(self.action, {})
+        if settings.RECIPE_FAST_SERIALIZER and self.action == 'retrieve':
+            # FastRecipeSerializer загружает связанные данные сам.
+            plan = self.list_plan
+        if plan.get('only'):
+            queryset = queryset.only(*plan['only'])
+        if plan.get('select_related'):
+            queryset = queryset.select_related(*plan['select_related'])
+        if plan.get('prefetch_related'):
+            queryset = queryset.prefetch_related(*plan['prefetch_related'])
+        if plan.get('user_flags'):
+            queryset = self.annotate_user_flags(queryset)
+        return queryset
+
+    def annotate_user_flags(self, queryset):
+        """Добавляем флаги избранного и списка покупок в основной запрос."""
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset
+        return queryset.annotate(
+            is_favorited=Exists(
+                Favorites.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingList.objects.filter(user=user, recipe=OuterRef('pk'))
+            )
+        )
+
+    def get_validator_versions(self, *namespaces):
+        """Версии пространств имён namespaces и данных, от которых зависит
+        ответ текущему пользователю, кроме самих рецептов."""
+        namespaces = [
+            *namespaces, TAGS_NAMESPACE, INGREDIENTS_NAMESPACE,
+            USERS_NAMESPACE
+        ]
+        if self.request.user.is_authenticated:
+            namespaces.append(user_namespace(self.request.user.id))
+        return get_cache_versions(*namespaces)
+
+    def list(self, request, *args, **kwargs):
+        """Список с ETag по версиям рецептов и связанных данных.
+
+        Избранное, список покупок и подписки пользователя, от которых
+        зависят фильтры, меняют версию его пространства имён, поэтому
+        ETag не требует запросов к БД."""
+        etag = make_etag(
+            request.get_full_path(),
+            self.get_validator_versions(RECIPES_NAMESPACE)
+        )
+        response = conditional_response(
+            request, partial(super().list, request, *args, **kwargs), etag)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        """Рецепт с ETag по updated_at и версиям связанных данных.
+
+        Ответ 304 определяется без сериализации рецепта. Last-Modified
+        не отдаётся: теги, ингредиенты и автор меняются без изменения
+        updated_at рецепта."""
+        try:
+            updated_at = Recipe.objects.values_list(
+                'updated_at', flat=True).get(pk=kwargs['pk'])
+        except (Recipe.DoesNotExist, TypeError, ValueError):
+            raise Http404
+        etag = make_etag(
+            kwargs['pk'], updated_at.isoformat(),
+            self.get_validator_versions()
+        )
+        response = conditional_response(
+            request,
+            partial(super().retrieve, request, *args, **kwargs),
+            etag
+        )
+        patch_vary_headers(response, ('Authorization',))
+        return response
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -125,6 +319,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def get_serializer_class(self):
         if self.request.method == 'POST' or self.request.method == 'PATCH':
             return RecipeCreateSerializer
+        if settings.RECIPE_FAST_SERIALIZER:
+            return FastRecipeSerializer
         return RecipeSerializer
 
     @action(detail=True, methods=['get'], url_path='get-link')
@@ -137,71 +333,127 @@ class RecipeViewSet(viewsets.ModelViewSet):
             status=status.HTTP_200_OK
         )
 
-    @staticmethod
-    def create_delete_shopping_cart_favorites(
-            request_method, current_serializer, current_model, recipe, user):
-        """Метод добавления и удаления рецепта в списка покупок и избранное."""
-        if request_method == 'POST':
-            serializer = current_serializer(
-                data={'recipe': recipe.id, 'user': user.id}
-            )
-            serializer.is_valid(raise_exception=True)
-            serializer.save(user=user)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        current_model.objects.filter(
-            user=user,
-            recipe=recipe
-        ).delete()
+    def create_delete_shopping_cart_favorites(self, current_model):
+        """Метод добавления и удаления рецепта в списка покупок и избранное.
+
+        Добавление и удаление выполняются одним запросом без загрузки
+        рецепта и проверок сериализатора; повторное добавление отклоняется
+        по ограничению уникальности."""
+        try:
+            recipe_id = int(self.kwargs['pk'])
+        except ValueError:
+            raise Http404(RECIPE_NOT_FOUND)
+        user_id = self.request.user.id
+        if self.request.method == 'POST':
+            recipe, created = add_user_recipe(
+                current_model, user_id, recipe_id)
+            if recipe is None:
+                raise Http404(RECIPE_NOT_FOUND)
+            if not created:
+                return Response(
+                    {api_settings.NON_FIELD_ERRORS_KEY: [
+                        UniqueTogetherValidator.message.format(
+                            field_names='user, recipe')
+                    ]},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            return Response(ShortRecipeSerializer(recipe).data,
+                            status=status.HTTP_201_CREATED)
+        if (
+            not remove_user_recipe(current_model, user_id, recipe_id)
+            and not Recipe.objects.filter(pk=recipe_id).exists()
+        ):
+            raise Http404(RECIPE_NOT_FOUND)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=['post', 'delete'], url_path='shopping_cart',
             permission_classes=[IsAuthenticated])
     def shopping_cart(self, request, *args, **kwargs):
         """Action для добавления и удаления рецепта в список покупок."""
-        return self.create_delete_shopping_cart_favorites(
-            request_method=self.request.method,
-            current_serializer=ShoppingListSerializer,
-            current_model=ShoppingList,
-            recipe=self.get_object(),
-            user=request.user
-        )
+        return self.create_delete_shopping_cart_favorites(ShoppingList)
 
     @action(detail=False, methods=['get'], url_path='download_shopping_cart',
-            permission_classes=[IsAuthenticated])
+            permission_classes=[IsAuthenticated],
+            content_negotiation_class=IgnoreFormatContentNegotiation)
     def download_shopping_cart(self, request, *args, **kwargs):
-        """Action для скачивания списка покупок."""
+        """Action для скачивания списка покупок.
+
+        Формат выбирается параметром format (txt, csv, json), файл
+        отдаётся потоком по мере чтения строк из БД."""
+        file_format = request.query_params.get('format', 'txt')
+        if file_format not in SHOPPING_LIST_FORMATS:
+            return Response(
+                {'format': [f'Доступные форматы: '
+                            f'{", ".join(SHOPPING_LIST_FORMATS)}.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         ingredients = (
-            RecipeIngredient.objects
-            .filter(recipe__shopping_list__user=request.user)
-            .values('ingredient__name', 'ingredient__measurement_unit')
-            .annotate(total_amount=Sum('amount'))
-            .order_by('ingredient__name')
+            ShoppingCartIngredient.objects
+            .filter(user=request.user, total_amount__gt=0)
+            .values(name=F('ingredient__name'),
+                    measurement_unit=F('ingredient__measurement_unit'),
+                    amount=F('total_amount'))
+            .order_by('name', 'measurement_unit')
+        )
+        cache_key = 'shopping_cart:{}:{}:{}'.format(
+            request.user.id,
+            get_cache_versions(
+                INGREDIENTS_NAMESPACE, user_namespace(request.user.id)),
+            file_format
         )
-        content = "Список покупок:\n\n"
-        count = 0
-        for item in ingredients:
-            count += 1
-            name = item['ingredient__name']
-            unit = item['ingredient__measurement_unit']
-            amount = item['total_amount']
-            content += f'{count}) {name} ({unit}): {amount}\n'
-
-        response = HttpResponse(content, content_type='text/plain')
-        response['Content-Disposition'] = ('attachment;'
-                                           'filename="shopping_cart.txt"')
+        return shopping_list_response(
+            ingredients.iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE),
+            file_format,
+            cache_key
+        )
+
+    @action(detail=False, methods=['post'], url_path='import',
+            permission_classes=[IsAuthenticated],
+            parser_classes=(JSONArrayParser, NDJSONParser))
+    def bulk_import(self, request, *args, **kwargs):
+        """Action для массового импорта рецептов текущего пользователя.
+
+        Принимает JSON-массив или NDJSON, оба читаются потоком. Возвращает
+        количество созданных рецептов и ошибки записей по их номеру."""
+        report = import_recipes(request.user, request.data)
+        return Response(
+            report,
+            status=(status.HTTP_201_CREATED if report['created']
+                    else status.HTTP_400_BAD_REQUEST)
+        )
+
+    @action(detail=False, methods=['get'], url_path='export',
+            permission_classes=[IsAdminUser])
+    def export(self, request, *args, **kwargs):
+        """Action для выгрузки рецептов, избранного, списков покупок и
+        подписок в NDJSON.
+
+        since - выгрузить только изменённое начиная с даты, gzip - сжать
+        выгрузку."""
+        since = request.query_params.get('since')
+        if since:
+            try:
+                since = parse_since(since)
+            except ValueError as error:
+                return Response({'since': [str(error)]},
+                                status=status.HTTP_400_BAD_REQUEST)
+        lines = iter_dump(since)
+        file_name = 'export.ndjson'
+        content_type = 'application/x-ndjson'
+        if request.query_params.get('gzip', '').lower() in ('1', 'true'):
+            lines = gzip_chunks(lines)
+            file_name += '.gz'
+            content_type = 'application/gzip'
+        response = StreamingHttpResponse(lines, content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="{file_name}"')
         return response
 
     @action(detail=True, methods=['post', 'delete'], url_path='favorite',
             permission_classes=[IsAuthenticated])
     def favorites(self, request, *args, **kwargs):
         """Action для добавления и удаления рецепта в избранное."""
-        return self.create_delete_shopping_cart_favorites(
-            request_method=self.request.method,
-            current_serializer=FavoritesSerializer,
-            current_model=Favorites,
-            recipe=self.get_object(),
-            user=request.user
-        )
+        return self.create_delete_shopping_cart_favorites(Favorites)
 
 
 def recipe_redirect_view(request, short_link):
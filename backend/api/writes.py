@@ -0,0 +1,146 @@
+"""Частые операции записи, выполняемые одним запросом к БД.
+
+Строки вставляются и удаляются SQL-запросом без ORM, поэтому сигналы
+моделей (счётчики, список покупок, версии кеша) отправляются вручную."""
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.utils import timezone
+
+from recipes.models import Recipe
+
+SHORT_RECIPE_FIELDS = ('id', 'name', 'image', 'cooking_time')
+
+
+def quote(model, *field_names):
+    """Имя таблицы и столбцов полей модели для SQL-запроса."""
+    quote_name = connection.ops.quote_name
+    return (
+        quote_name(model._meta.db_table),
+        *(
+            quote_name(model._meta.get_field(name).column)
+            for name in field_names
+        )
+    )
+
+
+def insert_relation(model, owner_field, target_field, owner_id, target_id):
+    """INSERT ... ON CONFLICT DO NOTHING строки model, связывающей owner с
+    target, если target существует.
+
+    Возвращает SQL с RETURNING id новой строки и его параметры."""
+    table, pk, owner, target, created_at = quote(
+        model, 'id', owner_field, target_field, 'created_at')
+    target_model = model._meta.get_field(target_field).related_model
+    target_table, target_pk = quote(target_model, 'id')
+    sql = (
+        f'INSERT INTO {table} ({owner}, {target}, {created_at}) '
+        f'SELECT %s, {target_pk}, %s FROM {target_table} '
+        f'WHERE {target_pk} = %s '
+        f'ON CONFLICT ({owner}, {target}) DO NOTHING '
+        f'RETURNING {pk}'
+    )
+    params = [
+        owner_id,
+        connection.ops.adapt_datetimefield_value(timezone.now()),
+        target_id
+    ]
+    return sql, params
+
+
+def send_created(model, pk, **fields):
+    instance = model(id=pk, **fields)
+    post_save.send(sender=model, instance=instance, created=True,
+                   update_fields=None, raw=False, using=connection.alias)
+
+
+def send_deleted(model, pk, **fields):
+    # Обработчики pre_delete читают только связанные строки, которые
+    # DELETE не меняет, поэтому сигнал можно отправить после запроса.
+    instance = model(id=pk, **fields)
+    for signal in (pre_delete, post_delete):
+        signal.send(sender=model, instance=instance,
+                    using=connection.alias, origin=instance)
+
+
+def add_relation(model, owner_field, target_field, owner_id, target_id):
+    """Создаёт строку model, если её ещё нет и target существует.
+
+    Возвращает True, если строка создана."""
+    sql, params = insert_relation(
+        model, owner_field, target_field, owner_id, target_id)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+        if row is not None:
+            send_created(model, row[0], **{
+                f'{owner_field}_id': owner_id,
+                f'{target_field}_id': target_id,
+            })
+    return row is not None
+
+
+def remove_relation(model, owner_field, target_field, owner_id, target_id):
+    """Удаляет строку model одним запросом DELETE.
+
+    Возвращает True, если строка была удалена."""
+    table, pk, owner, target = quote(model, 'id', owner_field, target_field)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE {owner} = %s AND {target} = %s '
+            f'RETURNING {pk}',
+            [owner_id, target_id]
+        )
+        row = cursor.fetchone()
+        if row is not None:
+            send_deleted(model, row[0], **{
+                f'{owner_field}_id': owner_id,
+                f'{target_field}_id': target_id,
+            })
+    return row is not None
+
+
+def fetch_short_recipe(cursor, recipe_id):
+    recipe_table, *columns = quote(Recipe, *SHORT_RECIPE_FIELDS)
+    cursor.execute(
+        f'SELECT {", ".join(columns)} FROM {recipe_table} '
+        f'WHERE {columns[0]} = %s',
+        [recipe_id]
+    )
+    return cursor.fetchone()
+
+
+def add_user_recipe(model, user_id, recipe_id):
+    """Добавляет рецепт в избранное или список покупок пользователя.
+
+    Возвращает пару (рецепт, создана ли строка). Рецепт - несохранённый
+    объект Recipe с полями SHORT_RECIPE_FIELDS или None, если рецепта нет.
+    Повторное добавление не создаёт строку и не вызывает ошибку БД."""
+    insert, params = insert_relation(
+        model, 'user', 'recipe', user_id, recipe_id)
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # Вставка и чтение рецепта за один запрос.
+            recipe_table, *columns = quote(Recipe, *SHORT_RECIPE_FIELDS)
+            cursor.execute(
+                f'WITH inserted AS ({insert}) '
+                f'SELECT (SELECT * FROM inserted), {", ".join(columns)} '
+                f'FROM {recipe_table} WHERE {columns[0]} = %s',
+                params + [recipe_id]
+            )
+            pk, *row = cursor.fetchone() or (None,)
+        else:
+            cursor.execute(insert, params)
+            pk, = cursor.fetchone() or (None,)
+            row = fetch_short_recipe(cursor, recipe_id)
+        if pk is not None:
+            send_created(model, pk, user_id=user_id, recipe_id=recipe_id)
+    if not row:
+        return None, False
+    return Recipe(**dict(zip(SHORT_RECIPE_FIELDS, row))), pk is not None
+
+
+def remove_user_recipe(model, user_id, recipe_id):
+    """Удаляет рецепт из избранного или списка покупок пользователя.
+
+    Возвращает True, если строка была удалена."""
+    return remove_relation(model, 'user', 'recipe', user_id, recipe_id)
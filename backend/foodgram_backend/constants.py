@@ -31,6 +31,29 @@ DEFAULT_PAGE_SIZE = 6
 PAGE_SIZE_PARAM = 'page'
 PAGE_SIZE_QUERY_PARAM = 'limit'
 PAGE_SIZE_MAX_LIMIT = 100
+CURSOR_QUERY_PARAM = 'cursor'
+COUNT_QUERY_PARAM = 'count'
+# seconds between refreshes of the cached unfiltered count
+PAGINATION_COUNT_CACHE_TIMEOUT = 60 * 5
+# below this planner estimate the exact COUNT(*) is used
+ESTIMATED_COUNT_MIN_ROWS = 10000
+# Shopping list export: rows fetched per server-side cursor round trip
+SHOPPING_LIST_CHUNK_SIZE = 500
+# seconds a rendered shopping list stays cached for its cart version, and
+# the largest file kept in the cache, bytes
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60
+SHOPPING_LIST_CACHE_MAX_SIZE = 256 * 1024
+# Recipe import: records validated and inserted per transaction, and
+# threads that validate records and store their images
+IMPORT_BATCH_SIZE = 500
+IMPORT_WORKERS = 4
+# Dataset export: rows fetched per server-side cursor round trip
+EXPORT_CHUNK_SIZE = 2000
+# load_ingredients: rows looked up and upserted per query
+INGREDIENTS_CHUNK_SIZE = 5000
+# Recipe search: snippet size in words (PostgreSQL) and characters (fallback)
+SEARCH_SNIPPET_MAX_WORDS = 35
+SEARCH_SNIPPET_LENGTH = 200
 # Admin zone
 # recipes
 OBJECTS_PER_PAGE = 30
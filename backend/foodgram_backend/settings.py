@@ -33,6 +33,7 @@ INSTALLED_APPS = [
     'django_filters',
     'rest_framework.authtoken',
     'djoser',
+    'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig'
 ]
@@ -83,6 +84,62 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+# Cache versions (api.cache) invalidate data in every process, so the cache
+# must be shared: by default it is Redis (the `redis` service of
+# docker-compose). DatabaseCache can be set through CACHE_BACKEND with the
+# table name in CACHE_LOCATION (`manage.py createcachetable`), but then every
+# cache operation is a query to the main database.
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND', 'django.core.cache.backends.redis.RedisCache')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', 'redis://redis:6379/1'),
+    }
+}
+if CACHE_BACKEND == 'django.core.cache.backends.db.DatabaseCache':
+    # MAX_ENTRIES is high enough to keep culling away from the version keys.
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 100000)),
+    }
+
+# In-process values built from the database (tag registry, ingredient
+# snapshot and autocomplete index) are rebuilt at least this often, seconds.
+PROCESS_LOCAL_CACHE_TTL = int(os.getenv('PROCESS_LOCAL_CACHE_TTL', 60))
+
+# Anonymous API responses lifetime, seconds.
+API_RESPONSE_CACHE_TIMEOUT = int(
+    os.getenv('API_RESPONSE_CACHE_TIMEOUT', 60 * 10))
+
+# Per-recipe cache of the user-independent part of RecipeSerializer output.
+RECIPE_FRAGMENT_CACHE = os.getenv(
+    'RECIPE_FRAGMENT_CACHE', 'true').lower() == 'true'
+RECIPE_FRAGMENT_TIMEOUT = int(
+    os.getenv('RECIPE_FRAGMENT_TIMEOUT', 60 * 60 * 24))
+
+# Build recipe list/retrieve responses from .values() rows instead of the
+# nested DRF serializers (same JSON, see api.fast_serializers).
+RECIPE_FAST_SERIALIZER = os.getenv(
+    'RECIPE_FAST_SERIALIZER', 'false').lower() == 'true'
+
+# Answer /api/ingredients/?name= from an in-process index (api.autocomplete),
+# optionally ranking matches by how often ingredients are used in recipes.
+INGREDIENT_AUTOCOMPLETE = os.getenv(
+    'INGREDIENT_AUTOCOMPLETE', 'true').lower() == 'true'
+INGREDIENT_AUTOCOMPLETE_RANK_BY_USAGE = os.getenv(
+    'INGREDIENT_AUTOCOMPLETE_RANK_BY_USAGE', 'false').lower() == 'true'
+
+# Serve the unfiltered /api/ingredients/ from a prebuilt snapshot with ETag
+# and gzip/brotli variants. If INGREDIENTS_SNAPSHOT_DIR is set the variants
+# are also written there so nginx can serve them directly.
+INGREDIENTS_SNAPSHOT = os.getenv(
+    'INGREDIENTS_SNAPSHOT', 'true').lower() == 'true'
+INGREDIENTS_SNAPSHOT_DIR = os.getenv('INGREDIENTS_SNAPSHOT_DIR', '')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -148,6 +205,11 @@ STATIC_ROOT = BASE_DIR / 'static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Pagination: use a cached (planner-estimated on PostgreSQL) total for
+# unfiltered lists instead of COUNT(*) on every request.
+PAGINATION_ESTIMATED_COUNT = os.getenv(
+    'PAGINATION_ESTIMATED_COUNT', 'false').lower() == 'true'
+
 # fixture path
 FIXTURE_PATH = BASE_DIR / 'fixtures_data'
 
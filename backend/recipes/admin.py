@@ -64,7 +64,8 @@ class RecipeAdmin(admin.ModelAdmin):
         'favorites_count',
         'created_at'
     )
-    readonly_fields = ('link', 'favorites_count', 'created_at', 'updated_at')
+    readonly_fields = ('link', 'favorites_count', 'shopping_list_count',
+                       'created_at', 'updated_at')
     inlines = (
         IngredientInLine,
     )
@@ -76,10 +77,6 @@ class RecipeAdmin(admin.ModelAdmin):
     search_fields = ('author__username', 'name')
     list_filter = ('tags',)
 
-    @admin.display(description='В избранном (кол-во)')
-    def favorites_count(self, obj):
-        return obj.favorites.count()
-
 
 @admin.register(Favorites)
 class FavoritesAdmin(admin.ModelAdmin):
@@ -0,0 +1,128 @@
+"""Агрегат списка покупок: суммы ингредиентов по пользователям."""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.dispatch import Signal
+
+from foodgram_backend.constants import BATCH_SIZE
+
+from .models import RecipeIngredient, ShoppingCartIngredient, ShoppingList
+
+# Код, который сам передаёт изменения ингредиентов в apply_cart_deltas,
+# отключает на это время обработчики сигналов RecipeIngredient.
+manual_deltas = ContextVar('manual_cart_deltas', default=False)
+
+# Изменились списки покупок пользователей с id из user_ids.
+carts_changed = Signal()
+
+
+@contextmanager
+def manual_cart_deltas():
+    token = manual_deltas.set(True)
+    try:
+        yield
+    finally:
+        manual_deltas.reset(token)
+
+
+def get_cart_users(recipe_id):
+    """id пользователей, у которых рецепт в списке покупок."""
+    return ShoppingList.objects.filter(
+        recipe_id=recipe_id).values_list('user_id', flat=True)
+
+
+def get_recipe_amounts(recipe_id):
+    """Количество каждого ингредиента рецепта: {ingredient_id: amount}."""
+    return dict(
+        RecipeIngredient.objects
+        .filter(recipe_id=recipe_id)
+        .values_list('ingredient_id', 'amount')
+    )
+
+
+def apply_cart_deltas(user_ids, deltas):
+    """Прибавляет deltas {ingredient_id: amount} к спискам покупок
+    пользователей user_ids.
+
+    Недостающие строки создаются с нулевой суммой, затем все затронутые
+    строки обновляются одним запросом, строки с нулевой суммой удаляются.
+    Сумма не уходит ниже нуля, расхождения исправляет команда
+    recount_counters."""
+    deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items() if delta
+    }
+    user_ids = list(user_ids)
+    if not deltas or not user_ids:
+        return
+    ShoppingCartIngredient.objects.bulk_create(
+        (
+            ShoppingCartIngredient(user_id=user_id,
+                                   ingredient_id=ingredient_id)
+            for user_id in user_ids for ingredient_id in deltas
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+    delta = Case(
+        *(
+            When(ingredient_id=ingredient_id, then=Value(amount))
+            for ingredient_id, amount in deltas.items()
+        ),
+        default=Value(0)
+    )
+    rows = ShoppingCartIngredient.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=deltas)
+    rows.update(total_amount=Greatest(F('total_amount') + delta, 0))
+    if any(amount < 0 for amount in deltas.values()):
+        rows.filter(total_amount=0).delete()
+    carts_changed.send(sender=ShoppingCartIngredient, user_ids=user_ids)
+
+
+def recount_carts():
+    """Пересчитывает суммы списков покупок по ShoppingList и удаляет
+    строки с нулевой суммой.
+
+    Возвращает количество исправленных строк."""
+    ShoppingCartIngredient.objects.bulk_create(
+        (
+            ShoppingCartIngredient(user_id=user_id,
+                                   ingredient_id=ingredient_id)
+            for user_id, ingredient_id in (
+                RecipeIngredient.objects
+                .filter(recipe__shopping_list__isnull=False)
+                .values_list('recipe__shopping_list__user', 'ingredient')
+                .distinct()
+                .iterator()
+            )
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+    actual = Coalesce(
+        Subquery(
+            RecipeIngredient.objects
+            .filter(recipe__shopping_list__user=OuterRef('user'),
+                    ingredient=OuterRef('ingredient'))
+            .order_by()
+            .values('ingredient')
+            .annotate(total=Sum('amount'))
+            .values('total')
+        ),
+        0
+    )
+    drifted = dict(
+        ShoppingCartIngredient.objects
+        .annotate(actual=actual)
+        .exclude(total_amount=F('actual'))
+        .values_list('pk', 'user_id')
+    )
+    ShoppingCartIngredient.objects.filter(pk__in=drifted).update(
+        total_amount=actual)
+    ShoppingCartIngredient.objects.filter(total_amount=0).delete()
+    if drifted:
+        carts_changed.send(sender=ShoppingCartIngredient,
+                           user_ids=set(drifted.values()))
+    return len(drifted)
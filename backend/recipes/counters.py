@@ -0,0 +1,44 @@
+"""Денормализованные счётчики рецептов и пользователей."""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def increment_counter(model, pk, field, delta):
+    """Атомарно изменяет счётчик field объекта на delta.
+
+    Счётчик не уходит ниже нуля, расхождения исправляет команда
+    recount_counters."""
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def count_subquery(model, field):
+    """Подзапрос с количеством строк model, ссылающихся на объект через
+    field."""
+    return Coalesce(
+        Subquery(
+            model.objects
+            .filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(count=Count('pk'))
+            .values('count')
+        ),
+        0
+    )
+
+
+def recount(model, field, related_model, related_field):
+    """Пересчитывает счётчик field для объектов с расхождением.
+
+    Возвращает количество исправленных объектов."""
+    actual = count_subquery(related_model, related_field)
+    drifted = (
+        model.objects
+        .annotate(actual=actual)
+        .exclude(**{field: F('actual')})
+        .values('pk')
+    )
+    return model.objects.filter(pk__in=drifted).update(**{field: actual})
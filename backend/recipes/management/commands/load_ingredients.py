@@ -1,38 +1,203 @@
-import json
+import csv
+import tempfile
+import time
+from itertools import islice
+from pathlib import Path
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import connection, transaction
 
+from api.cache import INGREDIENTS_NAMESPACE, bump_cache_version
+from api.jsonstream import iter_records
+from foodgram_backend.constants import (BATCH_SIZE, INGREDIENTS_CHUNK_SIZE,
+                                        MEASUREMENT_UNIT_FIELD_MAX_LENGTH,
+                                        TITLE_FIELD_MAX_LENGTH)
 from recipes.models import Ingredient
 
+FORMATS = ('csv', 'json')
+
+
+class JSONFormatError(Exception):
+    """Файл не является JSON-массивом или NDJSON."""
+
+
+def read_csv(file):
+    """Строки CSV без заголовка: название, единица измерения."""
+    for row in csv.reader(file):
+        if row == ['name', 'measurement_unit']:
+            continue
+        yield tuple(row)
+
+
+def read_json(file):
+    """Объекты JSON-массива или NDJSON, читаемые частями."""
+    for item, error in iter_records(file):
+        if error:
+            raise JSONFormatError(error)
+        yield (
+            (item.get('name'), item.get('measurement_unit'))
+            if isinstance(item, dict) else (item,)
+        )
+
+
+def clean(row):
+    """Название и единица измерения или None для некорректной строки."""
+    if len(row) != 2:
+        return None
+    name, unit = row
+    if not isinstance(name, str) or not isinstance(unit, str):
+        return None
+    name, unit = name.strip(), unit.strip()
+    if (
+        not name or not unit
+        or len(name) > TITLE_FIELD_MAX_LENGTH
+        or len(unit) > MEASUREMENT_UNIT_FIELD_MAX_LENGTH
+    ):
+        return None
+    return name, unit
+
 
 class Command(BaseCommand):
-    def handle(self, *args, **options):
-        fixture_path = f'{settings.FIXTURE_PATH}/ingredients.json'
+    help = ('Загружает ингредиенты из CSV (название, единица измерения) '
+            'или JSON, добавляя новые и обновляя единицы измерения.')
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=str(Path(settings.FIXTURE_PATH) / 'ingredients.csv'))
+        parser.add_argument('--format', choices=FORMATS,
+                            help='По умолчанию - по расширению файла.')
+        parser.add_argument('--chunk-size', type=int,
+                            default=INGREDIENTS_CHUNK_SIZE)
+        parser.add_argument('--copy', action='store_true',
+                            help='PostgreSQL: загрузка через COPY во '
+                                 'временную таблицу и слияние.')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in FORMATS:
+            self.stdout.write(self.style.ERROR(
+                f'Неизвестный формат файла: {path}'))
+            return
+        if options['copy'] and connection.vendor != 'postgresql':
+            self.stdout.write(self.style.ERROR(
+                'Загрузка через COPY доступна только для PostgreSQL'))
+            return
+        self.counts = dict.fromkeys(
+            ('inserted', 'updated', 'unchanged', 'skipped'), 0)
+        started = time.monotonic()
         try:
-            with open(fixture_path, 'r', encoding='utf-8') as f:
-                ingredients = json.load(f)
-
-                Ingredient.objects.bulk_create(
-                    [
-                        Ingredient(
-                            name=ingredient['name'],
-                            measurement_unit=ingredient['measurement_unit']
-                        ) for ingredient in ingredients
-                    ], ignore_conflicts=True
-                )
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f'Успешно загружено. \n'
-                        f'Записей в файле: {len(ingredients)}'
-                    )
+            with open(path, 'r', encoding='utf-8', newline='') as file:
+                rows = self.clean_rows(
+                    read_csv(file) if file_format == 'csv'
+                    else read_json(file)
                 )
-                self.stdout.write(self.style.SUCCESS('Команда завершена'))
+                if options['copy']:
+                    self.copy(rows)
+                else:
+                    while chunk := list(islice(rows, options['chunk_size'])):
+                        units = dict(chunk)
+                        # Из повторов названия в пачке берётся последняя
+                        # строка, остальные считаются пропущенными.
+                        self.counts['skipped'] += len(chunk) - len(units)
+                        self.upsert(units)
         except FileNotFoundError:
-            self.stdout.write(self.style.ERROR(
-                f'Файл не найден: {fixture_path}'))
-        except json.JSONDecodeError:
-            self.stdout.write(self.style.ERROR('Ошибка формата JSON'))
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Ошибка: {e}'))
+            self.stdout.write(self.style.ERROR(f'Файл не найден: {path}'))
+            return
+        except csv.Error as error:
+            self.stdout.write(self.style.ERROR(f'Ошибка формата: {error}'))
+            return
+        except JSONFormatError as error:
+            self.stdout.write(self.style.ERROR(str(error)))
+            return
+        finally:
+            if self.counts['inserted'] or self.counts['updated']:
+                bump_cache_version(INGREDIENTS_NAMESPACE)
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено: {self.counts["inserted"]}, '
+            f'обновлено: {self.counts["updated"]}, '
+            f'без изменений: {self.counts["unchanged"]}, '
+            f'пропущено: {self.counts["skipped"]}, '
+            f'время: {time.monotonic() - started:.2f} с'
+        ))
+        self.stdout.write(self.style.SUCCESS('Команда завершена'))
+
+    def clean_rows(self, rows):
+        for row in rows:
+            row = clean(row)
+            if row is None:
+                self.counts['skipped'] += 1
+            else:
+                yield row
+
+    def upsert(self, units):
+        """Добавляет и обновляет ингредиенты пачки {название: единица}."""
+        existing = dict(
+            Ingredient.objects
+            .filter(name__in=units)
+            .values_list('name', 'measurement_unit')
+        )
+        changed = [
+            Ingredient(name=name, measurement_unit=unit)
+            for name, unit in units.items()
+            if existing.get(name) != unit
+        ]
+        updated = sum(ingredient.name in existing for ingredient in changed)
+        Ingredient.objects.bulk_create(
+            changed,
+            batch_size=BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['name'],
+            update_fields=['measurement_unit']
+        )
+        self.counts['inserted'] += len(changed) - updated
+        self.counts['updated'] += updated
+        self.counts['unchanged'] += len(units) - len(changed)
+
+    @transaction.atomic()
+    def copy(self, rows):
+        """COPY строк во временную таблицу и слияние одним запросом."""
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        with tempfile.SpooledTemporaryFile(mode='w+', newline='') as data, \
+                connection.cursor() as cursor:
+            csv.writer(data).writerows(rows)
+            data.seek(0)
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_staging ('
+                'position bigserial, '
+                f'name varchar({TITLE_FIELD_MAX_LENGTH}), measurement_unit '
+                f'varchar({MEASUREMENT_UNIT_FIELD_MAX_LENGTH})'
+                ') ON COMMIT DROP'
+            )
+            cursor.copy_expert(
+                'COPY ingredient_staging (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv)',
+                data
+            )
+            # Из повторяющихся названий берётся последняя строка файла.
+            cursor.execute(
+                'WITH merged AS ('
+                f'INSERT INTO {table} AS ingredient '
+                '(name, measurement_unit, created_at) '
+                'SELECT DISTINCT ON (name) name, measurement_unit, now() '
+                'FROM ingredient_staging ORDER BY name, position DESC '
+                'ON CONFLICT (name) DO UPDATE '
+                'SET measurement_unit = EXCLUDED.measurement_unit '
+                'WHERE ingredient.measurement_unit '
+                'IS DISTINCT FROM EXCLUDED.measurement_unit '
+                'RETURNING xmax = 0 AS inserted'
+                ') '
+                'SELECT '
+                '(SELECT count(*) FROM ingredient_staging), '
+                '(SELECT count(DISTINCT name) FROM ingredient_staging), '
+                'count(*) FILTER (WHERE inserted), '
+                'count(*) FILTER (WHERE NOT inserted) '
+                'FROM merged'
+            )
+            rows_count, total, inserted, updated = cursor.fetchone()
+        self.counts['skipped'] += rows_count - total
+        self.counts['inserted'] += inserted
+        self.counts['updated'] += updated
+        self.counts['unchanged'] += total - inserted - updated
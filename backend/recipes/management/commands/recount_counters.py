@@ -0,0 +1,31 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from recipes.carts import recount_carts
+from recipes.counters import recount
+from recipes.models import Favorites, Recipe, ShoppingList
+from users.models import Subscription
+
+User = get_user_model()
+
+# Счётчик и строки, которые он считает.
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorites, 'recipe'),
+    (Recipe, 'shopping_list_count', ShoppingList, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscribers_count', Subscription, 'user'),
+)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает денормализованные счётчики и списки покупок '
+            'и исправляет расхождения.')
+
+    def handle(self, *args, **options):
+        for model, field, related_model, related_field in COUNTERS:
+            repaired = recount(model, field, related_model, related_field)
+            self.stdout.write(
+                f'{model.__name__}.{field}: исправлено записей {repaired}')
+        self.stdout.write(
+            f'ShoppingCartIngredient: исправлено записей {recount_carts()}')
+        self.stdout.write(self.style.SUCCESS('Команда завершена'))
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.20 on 2026-10-18 02:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_alter_recipeingredient_recipe'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном (кол-во)'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='shopping_list_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В списках покупок (кол-во)'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+from django.db.models import Sum
+
+
+def fill_shopping_carts(apps, schema_editor):
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingCartIngredient = apps.get_model(
+        'recipes', 'ShoppingCartIngredient')
+    totals = (
+        RecipeIngredient.objects
+        .filter(recipe__shopping_list__isnull=False)
+        .values_list('recipe__shopping_list__user', 'ingredient')
+        .annotate(total=Sum('amount'))
+        .order_by()
+    )
+    ShoppingCartIngredient.objects.bulk_create(
+        (
+            ShoppingCartIngredient(user_id=user_id,
+                                   ingredient_id=ingredient_id,
+                                   total_amount=total,
+                                   cart_version=1)
+            for user_id, ingredient_id, total in totals.iterator()
+        ),
+        batch_size=100
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_shoppingcartingredient'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_shopping_carts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.20 on 2026-10-18 03:34
+
+from django.db import migrations
+
+
+def delete_zero_rows(apps, schema_editor):
+    ShoppingCartIngredient = apps.get_model(
+        'recipes', 'ShoppingCartIngredient')
+    ShoppingCartIngredient.objects.filter(total_amount=0).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0019_recipe_search_index'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='shoppingcartingredient',
+            name='cart_version',
+        ),
+        migrations.RunPython(delete_zero_rows, migrations.RunPython.noop),
+    ]
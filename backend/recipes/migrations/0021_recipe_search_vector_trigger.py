@@ -0,0 +1,45 @@
+from django.db import migrations
+
+FUNCTION_NAME = 'recipes_recipe_search_vector_update'
+TRIGGER_NAME = 'recipes_recipe_search_vector_trigger'
+
+
+def create_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    table = apps.get_model('recipes', 'Recipe')._meta.db_table
+    # Тот же вектор, что строили SearchVector('name', weight='A') +
+    # SearchVector('text', weight='B') с конфигурацией russian.
+    schema_editor.execute(
+        f'CREATE OR REPLACE FUNCTION {FUNCTION_NAME}() RETURNS trigger AS $$ '
+        'BEGIN '
+        'NEW.search_vector := '
+        "setweight(to_tsvector('russian', COALESCE(NEW.name, '')), 'A') "
+        "|| setweight(to_tsvector('russian', COALESCE(NEW.text, '')), 'B'); "
+        'RETURN NEW; '
+        'END $$ LANGUAGE plpgsql'
+    )
+    schema_editor.execute(
+        f'CREATE TRIGGER {TRIGGER_NAME} '
+        f'BEFORE INSERT OR UPDATE OF name, text ON {table} '
+        f'FOR EACH ROW EXECUTE FUNCTION {FUNCTION_NAME}()'
+    )
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    table = apps.get_model('recipes', 'Recipe')._meta.db_table
+    schema_editor.execute(f'DROP TRIGGER IF EXISTS {TRIGGER_NAME} ON {table}')
+    schema_editor.execute(f'DROP FUNCTION IF EXISTS {FUNCTION_NAME}()')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0020_shopping_cart_prune_zero_rows'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
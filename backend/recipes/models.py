@@ -1,7 +1,10 @@
 """Модели приложения recipes."""
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.dispatch import Signal
+from django.utils import timezone
 from django.utils.crypto import get_random_string
 from django.utils.translation import gettext_lazy as _
 
@@ -19,6 +22,7 @@ from foodgram_backend.constants import (AMOUNT_INGREDIENT_FIELD_MAX,
                                         TEASPOON_UNIT, TITLE_FIELD_MAX_LENGTH,
                                         TO_TASTE_UNIT)
 
+
 User = get_user_model()
 
 
@@ -97,6 +101,23 @@ class Ingredient(AbstractNameModel):
         return f'{self.name} {self.measurement_unit}'
 
 
+# Рецепты с id из recipe_ids изменены в обход сигналов моделей.
+recipes_touched = Signal()
+
+
+class RecipeIngredientQuerySet(models.QuerySet):
+
+    def update(self, **kwargs):
+        """update() не отправляет сигналы моделей, поэтому сам отмечает
+        изменение рецептов."""
+        recipe_ids = set(self.values_list('recipe_id', flat=True))
+        rows = super().update(**kwargs)
+        if rows:
+            Recipe.touch(recipe_ids)
+            recipes_touched.send(sender=Recipe, recipe_ids=recipe_ids)
+        return rows
+
+
 class RecipeIngredient(models.Model):
     """Промежуточная модель с количеством ингридиента."""
 
@@ -142,10 +163,19 @@ class RecipeIngredient(models.Model):
         verbose_name_plural = _('Количество ингридиентов')
         default_related_name = 'recipe_ingredients'
 
+    objects = RecipeIngredientQuerySet.as_manager()
+
     def __str__(self):
         return f'{self.ingredient} {self.amount}'
 
 
+class RecipeManager(models.Manager):
+
+    def get_queryset(self):
+        """search_vector нужен только в условиях поиска и не загружается."""
+        return super().get_queryset().defer('search_vector')
+
+
 class Recipe(AbstractNameModel):
     """Модель рецепта."""
 
@@ -205,6 +235,25 @@ class Recipe(AbstractNameModel):
         auto_now=True,
         verbose_name=_('Дата обновления')
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_('В избранном (кол-во)')
+    )
+    shopping_list_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_('В списках покупок (кол-во)')
+    )
+    # Заполняется триггером PostgreSQL при записи name и text, см.
+    # recipes.search.
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name=_('Поисковый вектор')
+    )
+
+    objects = RecipeManager()
 
     class Meta:
         verbose_name = _('Рецепт')
@@ -213,13 +262,33 @@ class Recipe(AbstractNameModel):
 
     def save(self, *args, **kwargs):
         if not self.link:
-            self.link = get_random_string(
-                length=LINK_FIELD_MAX_LENGTH)
-            while Recipe.objects.filter(link=self.link).exists():
-                self.link = get_random_string(
-                    length=LINK_FIELD_MAX_LENGTH)
+            self.link, = self.generate_links(1)
         super().save(*args, **kwargs)
 
+    @classmethod
+    def touch(cls, recipe_ids):
+        """Обновляет updated_at рецептов: от него зависят ETag и кеш
+        фрагментов списка."""
+        cls.objects.filter(pk__in=recipe_ids).update(
+            updated_at=timezone.now())
+
+    @classmethod
+    def generate_links(cls, count):
+        """count уникальных коротких ссылок, которых ещё нет в БД."""
+        links = set()
+        while len(links) < count:
+            candidates = {
+                get_random_string(length=LINK_FIELD_MAX_LENGTH)
+                for _ in range(count - len(links))
+            } - links
+            candidates -= set(
+                cls.objects
+                .filter(link__in=candidates)
+                .values_list('link', flat=True)
+            )
+            links |= candidates
+        return list(links)
+
 
 class AbstractUserRecipesModel(models.Model):
     """Абстрактная модель с полем пользователь и рецепт."""
@@ -270,3 +339,39 @@ class Favorites(AbstractUserRecipesModel):
         verbose_name_plural = _('Избранное')
         default_related_name = 'favorites'
         ordering = ('-created_at',)
+
+
+class ShoppingCartIngredient(models.Model):
+    """Сумма ингредиента по всем рецептам в списке покупок пользователя.
+
+    Обновляется при добавлении и удалении рецептов из списка покупок и при
+    изменении ингредиентов рецепта, строки с нулевой суммой удаляются."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name=_('Пользователь')
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name=_('Ингридиент')
+    )
+    total_amount = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('Количество')
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_cart_ingredient'
+            )
+        ]
+        verbose_name = _('Ингридиент списка покупок')
+        verbose_name_plural = _('Ингридиенты списков покупок')
+        default_related_name = 'shopping_cart_ingredients'
+
+    def __str__(self):
+        return f'{self.ingredient} {self.total_amount}'
@@ -0,0 +1,106 @@
+"""Полнотекстовый поиск рецептов по названию и описанию.
+
+В PostgreSQL поиск идёт по хранимому search_vector с GIN-индексом,
+его заполняет триггер при записи названия и описания (миграция 0021).
+Результаты упорядочены по ts_rank, фрагмент описания с подсветкой строит
+ts_headline. В остальных СУБД каждое слово запроса ищется вхождением
+в название или описание.
+
+Описание рецепта пишет пользователь, поэтому СУБД отмечает совпадения во
+фрагменте символами-маркерами, а HTML-разметку с экранированием текста
+строит render_snippet."""
+from functools import reduce
+from html import escape
+
+from django.contrib.postgres.search import (SearchHeadline, SearchQuery,
+                                            SearchRank)
+from django.db import connections
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.functions import (Greatest, Lower, Replace, StrIndex,
+                                        Substr)
+
+from foodgram_backend.constants import (SEARCH_SNIPPET_LENGTH,
+                                        SEARCH_SNIPPET_MAX_WORDS)
+
+SEARCH_CONFIG = 'russian'
+HIGHLIGHT_START = '<b>'
+HIGHLIGHT_STOP = '</b>'
+# Символы из области частного использования Unicode, перед построением
+# фрагмента удаляются из описания.
+START_MARKER = '\ue000'
+STOP_MARKER = '\ue001'
+
+
+def is_fulltext(using):
+    return connections[using].vendor == 'postgresql'
+
+
+def search_recipes(queryset, value):
+    """Рецепты, подходящие под запрос value, по убыванию релевантности.
+
+    Добавляет аннотации search_rank и search_snippet."""
+    if is_fulltext(queryset.db):
+        query = SearchQuery(value, config=SEARCH_CONFIG,
+                            search_type='websearch')
+        queryset = queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query),
+            search_snippet=SearchHeadline(
+                snippet_source(), query,
+                config=SEARCH_CONFIG,
+                start_sel=START_MARKER,
+                stop_sel=STOP_MARKER,
+                max_words=SEARCH_SNIPPET_MAX_WORDS,
+                min_words=SEARCH_SNIPPET_MAX_WORDS // 2
+            )
+        )
+        return queryset.order_by('-search_rank', '-created_at', '-id')
+    words = value.lower().split()
+    if not words:
+        return queryset
+    for word in words:
+        queryset = queryset.filter(
+            Q(name__icontains=word) | Q(text__icontains=word))
+    return queryset.annotate(
+        search_rank=Case(
+            When(name__icontains=words[0], then=Value(2)),
+            default=Value(1),
+            output_field=IntegerField()
+        ),
+        search_snippet=simple_snippet(words)
+    ).order_by('-search_rank', '-created_at', '-id')
+
+
+def simple_snippet(words):
+    """Фрагмент описания вокруг первого слова запроса с подсветкой слов.
+
+    Регистр учитывается только так, как его учитывает СУБД."""
+    start = Greatest(
+        StrIndex(Lower('text'), Value(words[0])) - SEARCH_SNIPPET_LENGTH // 2,
+        Value(1)
+    )
+    snippet = Substr(snippet_source(), start, SEARCH_SNIPPET_LENGTH)
+    return reduce(
+        lambda snippet, word: Replace(
+            snippet, Value(word),
+            Value(f'{START_MARKER}{word}{STOP_MARKER}')
+        ),
+        words,
+        snippet
+    )
+
+
+def snippet_source():
+    """Описание рецепта без символов-маркеров."""
+    return Replace(
+        Replace('text', Value(START_MARKER), Value('')),
+        Value(STOP_MARKER), Value('')
+    )
+
+
+def render_snippet(snippet):
+    """HTML фрагмента: текст экранирован, совпадения выделены тегами."""
+    return (
+        escape(snippet)
+        .replace(START_MARKER, HIGHLIGHT_START)
+        .replace(STOP_MARKER, HIGHLIGHT_STOP)
+    )
@@ -0,0 +1,125 @@
+"""Сигналы приложения recipes."""
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from .carts import (apply_cart_deltas, get_cart_users, get_recipe_amounts,
+                    manual_deltas)
+from .counters import increment_counter
+from .models import Favorites, Recipe, RecipeIngredient, ShoppingList
+
+User = get_user_model()
+
+# Модель, за которой следят счётчики: поле с id объекта, модель объекта
+# и поле счётчика.
+COUNTERS = {
+    Favorites: ('recipe_id', Recipe, 'favorites_count'),
+    ShoppingList: ('recipe_id', Recipe, 'shopping_list_count'),
+    Recipe: ('author_id', User, 'recipes_count'),
+}
+
+
+@receiver(post_save, sender=Favorites)
+@receiver(post_save, sender=ShoppingList)
+@receiver(post_save, sender=Recipe)
+def increment_counters(sender, instance, created, **kwargs):
+    if created:
+        fk_field, model, field = COUNTERS[sender]
+        increment_counter(model, getattr(instance, fk_field), field, 1)
+
+
+@receiver(post_delete, sender=Favorites)
+@receiver(post_delete, sender=ShoppingList)
+@receiver(post_delete, sender=Recipe)
+def decrement_counters(sender, instance, **kwargs):
+    fk_field, model, field = COUNTERS[sender]
+    increment_counter(model, getattr(instance, fk_field), field, -1)
+
+
+@receiver(post_save, sender=ShoppingList)
+def add_to_cart(sender, instance, created, **kwargs):
+    if created:
+        apply_cart_deltas(
+            [instance.user_id], get_recipe_amounts(instance.recipe_id))
+
+
+# pre_delete, потому что при удалении рецепта его ингредиенты могут быть
+# удалены раньше строк списка покупок.
+@receiver(pre_delete, sender=ShoppingList)
+def remove_from_cart(sender, instance, **kwargs):
+    apply_cart_deltas(
+        [instance.user_id],
+        {
+            ingredient_id: -amount for ingredient_id, amount
+            in get_recipe_amounts(instance.recipe_id).items()
+        }
+    )
+
+
+# Изменения ингредиентов рецептов вне RecipeCreateSerializer (админка,
+# ORM, миграции данных) тоже попадают в списки покупок.
+@receiver(pre_save, sender=RecipeIngredient)
+def remember_recipe_ingredient(sender, instance, raw, **kwargs):
+    instance._cart_old_row = None
+    if instance.pk and not raw and not manual_deltas.get():
+        instance._cart_old_row = (
+            RecipeIngredient.objects
+            .filter(pk=instance.pk)
+            .values_list('recipe_id', 'ingredient_id', 'amount')
+            .first()
+        )
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def update_carts_on_save(sender, instance, raw, **kwargs):
+    old_row = instance.__dict__.pop('_cart_old_row', None)
+    if raw or manual_deltas.get():
+        return
+    deltas = {}
+    if old_row is not None:
+        recipe_id, ingredient_id, amount = old_row
+        deltas.setdefault(recipe_id, {})[ingredient_id] = -amount
+    recipe_deltas = deltas.setdefault(instance.recipe_id, {})
+    recipe_deltas[instance.ingredient_id] = (
+        recipe_deltas.get(instance.ingredient_id, 0) + instance.amount)
+    for recipe_id, recipe_deltas in deltas.items():
+        apply_cart_deltas(get_cart_users(recipe_id), recipe_deltas)
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def update_carts_on_delete(sender, instance, origin=None, **kwargs):
+    # При удалении рецепта суммы вычитает remove_from_cart, при удалении
+    # ингредиента удаляются и строки агрегата.
+    origin_model = (
+        origin.model if isinstance(origin, QuerySet) else type(origin))
+    if origin_model is not RecipeIngredient or manual_deltas.get():
+        return
+    apply_cart_deltas(
+        get_cart_users(instance.recipe_id),
+        {instance.ingredient_id: -instance.amount}
+    )
+
+
+# Теги и ингредиенты входят в представление рецепта, поэтому их изменение
+# через ORM или админку обновляет updated_at рецепта.
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def touch_recipe(sender, instance, raw=False, origin=None, **kwargs):
+    origin_model = (
+        origin.model if isinstance(origin, QuerySet) else type(origin))
+    if raw or origin_model is Recipe:
+        return
+    Recipe.touch([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def touch_tagged_recipes(sender, instance, action, reverse, pk_set,
+                         **kwargs):
+    if action in ('post_add', 'post_remove') and pk_set:
+        Recipe.touch(pk_set if reverse else [instance.pk])
+    elif action == 'post_clear' and not reverse:
+        Recipe.touch([instance.pk])
+    elif action == 'pre_clear' and reverse:
+        Recipe.touch(list(instance.recipe_set.values_list('pk', flat=True)))
@@ -1,4 +1,14 @@
 import pytest
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Кеш не переносится между тестами."""
+    cache.clear()
 
 
 @pytest.fixture
@@ -22,3 +32,96 @@ def user(django_user_model):
         last_name='User Lastname',
         password='jefF2hd23D2!'
     )
+
+
+@pytest.fixture
+def user_client(user):
+    """Клиент API, авторизованный как user."""
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+@pytest.fixture
+def staff_client(django_user_model):
+    """Клиент API, авторизованный как администратор."""
+    client = APIClient()
+    client.force_authenticate(user=django_user_model.objects.create(
+        email='staff@yamdb.fake',
+        username='Staff',
+        first_name='Staff Firstname',
+        last_name='Staff Lastname',
+        password='jefF2hd23D2!',
+        is_staff=True
+    ))
+    return client
+
+
+@pytest.fixture
+def tag():
+    return Tag.objects.create(name='Завтрак', slug='breakfast')
+
+
+@pytest.fixture
+def ingredients():
+    return [
+        Ingredient.objects.create(name=f'Ингредиент {i}',
+                                  measurement_unit='г')
+        for i in range(3)
+    ]
+
+
+@pytest.fixture
+def make_recipes(user, tag, ingredients):
+    """Фабрика рецептов пользователя user с тегом и ингредиентами."""
+    def make(count, author=user):
+        recipes = []
+        for i in range(count):
+            recipe = Recipe.objects.create(
+                author=author,
+                name=f'Рецепт {i}',
+                text='Описание',
+                image='recipe/images/test.png',
+                cooking_time=10
+            )
+            recipe.tags.set([tag])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=i + 1)
+                for ingredient in ingredients
+            )
+            recipes.append(recipe)
+        return recipes
+    return make
+
+
+@pytest.fixture
+def author(django_user_model):
+    return django_user_model.objects.create(
+        email='author@yamdb.fake',
+        username='Author',
+        first_name='Author Firstname',
+        last_name='Author Lastname',
+        password='jefF2hd23D2!',
+        avatar='users/images/avatar.png'
+    )
+
+
+@pytest.fixture
+def recipe_payload(settings, tmp_path, tag, ingredients):
+    """Данные для создания рецепта через API."""
+    settings.MEDIA_ROOT = tmp_path
+    return {
+        'name': 'Новый рецепт',
+        'text': 'Описание',
+        'cooking_time': 15,
+        'image': (
+            'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAAC'
+            'Qd1PeAAAADElEQVR4nGNgYGAAAAAEAAH2FzhVAAAAAElFTkSuQmCC'
+        ),
+        'tags': [tag.id],
+        'ingredients': [
+            {'id': ingredient.id, 'amount': 10}
+            for ingredient in ingredients
+        ],
+    }
@@ -0,0 +1,136 @@
+import gzip
+import json
+from http import HTTPStatus
+from io import StringIO
+
+import brotli
+import pytest
+from django.core.management import call_command
+
+from api.autocomplete import IngredientIndex
+from recipes.models import Ingredient
+
+
+@pytest.mark.django_db(transaction=True)
+class TestIngredientAPI:
+    INGREDIENTS_URL = '/api/ingredients/'
+
+    @pytest.mark.parametrize('value', ('мол', 'ко', 'о', 'нет'))
+    def test_autocomplete_matches_filter(self, settings, client, value):
+        """Индекс возвращает тот же результат, что и запрос к БД."""
+        for name in ('молоко', 'кокосовое молоко', 'сгущённое молоко',
+                     'морковь', 'Мука'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+        url = f'{self.INGREDIENTS_URL}?name={value}'
+        settings.INGREDIENT_AUTOCOMPLETE = False
+        expected = client.get(url).json()
+        settings.INGREDIENT_AUTOCOMPLETE = True
+        response = client.get(url)
+        assert response.status_code == HTTPStatus.OK
+        assert response.json() == expected
+
+    def test_autocomplete_sees_new_ingredients(self, client):
+        """Индекс перестраивается после добавления ингредиента."""
+        url = f'{self.INGREDIENTS_URL}?name=соль'
+        assert client.get(url).json() == []
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+        assert [item['name'] for item in client.get(url).json()] == ['соль']
+
+    def test_autocomplete_keeps_database_order(self):
+        """Внутри группы совпадений порядок строк из БД сохраняется, даже
+        если он не совпадает с порядком кодов символов (сопоставление
+        ru_RU в PostgreSQL)."""
+        index = IngredientIndex([
+            {'id': 1, 'name': 'молоко'},
+            {'id': 2, 'name': 'Мука'},
+        ])
+        assert [row['id'] for row in index.search('м')] == [1, 2]
+        assert [row['id'] for row in index.search('о')] == [1]
+
+    def test_catalog_snapshot(self, settings, client):
+        """Полный каталог отдаётся снимком с ETag и ответом 304."""
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+        settings.INGREDIENTS_SNAPSHOT = False
+        expected = client.get(self.INGREDIENTS_URL).content
+        settings.INGREDIENTS_SNAPSHOT = True
+        response = client.get(self.INGREDIENTS_URL)
+        assert response.status_code == HTTPStatus.OK
+        assert response.content == expected
+
+        response = client.get(self.INGREDIENTS_URL,
+                              HTTP_IF_NONE_MATCH=response['ETag'])
+        assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+        response = client.get(self.INGREDIENTS_URL,
+                              HTTP_ACCEPT_ENCODING='gzip, deflate')
+        assert response['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(response.content) == expected
+
+        response = client.get(self.INGREDIENTS_URL,
+                              HTTP_ACCEPT_ENCODING='gzip, br')
+        assert response['Content-Encoding'] == 'br'
+        assert brotli.decompress(response.content) == expected
+
+
+@pytest.mark.django_db(transaction=True)
+class TestLoadIngredients:
+
+    def load(self, path, **options):
+        out = StringIO()
+        call_command('load_ingredients', str(path), stdout=out, **options)
+        return out.getvalue()
+
+    def test_load_csv(self, client, tmp_path):
+        """Повторная загрузка обновляет единицы и сбрасывает кеш."""
+        path = tmp_path / 'ingredients.csv'
+        path.write_text(
+            'name,measurement_unit\n'
+            'соль,г\n"перец, молотый",г\n,г\nсоль,кг\n',
+            encoding='utf-8'
+        )
+        output = self.load(path, chunk_size=1)
+        assert 'Добавлено: 2, обновлено: 1, без изменений: 0, ' \
+               'пропущено: 1' in output
+        assert dict(
+            Ingredient.objects.values_list('name', 'measurement_unit')
+        ) == {'соль': 'кг', 'перец, молотый': 'г'}
+        assert len(client.get('/api/ingredients/').json()) == 2
+
+        path.write_text(
+            'соль,кг\nперец,мл\nперец,г\n"перец, молотый",шт\n',
+            encoding='utf-8'
+        )
+        output = self.load(path)
+        assert 'Добавлено: 1, обновлено: 1, без изменений: 1, ' \
+               'пропущено: 1' in output
+        assert Ingredient.objects.get(name='перец').measurement_unit == 'г'
+        assert len(client.get('/api/ingredients/').json()) == 3
+
+    @pytest.mark.parametrize('ndjson', (False, True))
+    def test_load_json(self, tmp_path, ndjson):
+        items = [{'name': f'ингредиент {index}', 'measurement_unit': 'г'}
+                 for index in range(5)]
+        path = tmp_path / 'ingredients.data'
+        path.write_text(
+            '\n'.join(map(json.dumps, items)) if ndjson
+            else json.dumps(items, indent=2),
+            encoding='utf-8'
+        )
+        output = self.load(path, format='json', chunk_size=2)
+        assert 'Добавлено: 5' in output
+        assert Ingredient.objects.count() == 5
+
+    @pytest.mark.parametrize('content', (
+        ']]{"name": "соль", "measurement_unit": "г"}',
+        '{"name": "соль", "measurement_unit": "г"}'
+        '{"name": "перец", "measurement_unit": "г"}',
+        '[{"name": "соль", "measurement_unit": "г"}]]',
+        '[{"name": "соль", "measurement_unit": "г"},]',
+    ))
+    def test_load_json_rejects_malformed(self, tmp_path, content):
+        """Принимается только один JSON-массив или NDJSON."""
+        path = tmp_path / 'ingredients.json'
+        path.write_text(content, encoding='utf-8')
+        output = self.load(path)
+        assert 'Ошибка формата JSON' in output
+        assert not Ingredient.objects.exists()
@@ -0,0 +1,728 @@
+import gzip
+import json
+from base64 import urlsafe_b64encode
+from http import HTTPStatus
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
+
+from api import exports, jsonstream
+from api.cache import get_cache_versions, user_namespace
+from recipes.models import (Favorites, RecipeIngredient,
+                            ShoppingCartIngredient, ShoppingList, Tag)
+from users.models import Subscription
+
+
+@pytest.mark.django_db(transaction=True)
+class TestRecipeAPI:
+    RECIPES_URL = '/api/recipes/'
+
+    def count_queries(self, client, url):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        assert response.status_code == HTTPStatus.OK
+        return len(context)
+
+    def test_recipe_list_query_count_is_constant(self, user_client,
+                                                 make_recipes):
+        """Число запросов к БД не зависит от размера страницы."""
+        make_recipes(6)
+        small_page = self.count_queries(
+            user_client, f'{self.RECIPES_URL}?limit=1')
+        full_page = self.count_queries(
+            user_client, f'{self.RECIPES_URL}?limit=6')
+        assert small_page == full_page
+
+    def test_recipe_list_flags_in_list_query(self, user_client, user,
+                                             make_recipes):
+        """Флаги избранного и списка покупок вычисляются в запросе списка,
+        а не отдельным запросом на каждый рецепт."""
+        recipes = make_recipes(4)
+        Favorites.objects.create(user=user, recipe=recipes[0])
+        ShoppingList.objects.create(user=user, recipe=recipes[1])
+        with CaptureQueriesContext(connection) as context:
+            response = user_client.get(self.RECIPES_URL)
+        assert {
+            recipe['id']: (recipe['is_favorited'],
+                           recipe['is_in_shopping_cart'])
+            for recipe in response.json()['results']
+        } == {
+            recipe.id: (recipe == recipes[0], recipe == recipes[1])
+            for recipe in recipes
+        }
+        assert all(
+            'EXISTS' in query['sql']
+            for query in context.captured_queries
+            if 'recipes_favorites' in query['sql']
+            or 'recipes_shoppinglist' in query['sql']
+        )
+
+    def test_recipe_list_subscriptions_loaded_once(
+            self, user_client, user, django_user_model, make_recipes):
+        """Подписки текущего пользователя загружаются одним запросом на
+        весь список."""
+        authors = [
+            django_user_model.objects.create(
+                email=f'author{index}@yamdb.fake', username=f'author{index}',
+                first_name='Имя', last_name='Фамилия')
+            for index in range(3)
+        ]
+        for author in authors:
+            make_recipes(1, author=author)
+        Subscription.objects.create(subscriber=user, user=authors[0])
+        with CaptureQueriesContext(connection) as context:
+            response = user_client.get(self.RECIPES_URL)
+        assert {
+            recipe['author']['id']: recipe['author']['is_subscribed']
+            for recipe in response.json()['results']
+        } == {author.id: author == authors[0] for author in authors}
+        assert len([
+            query for query in context.captured_queries
+            if 'users_subscription' in query['sql']
+        ]) == 1
+
+    def test_recipe_detail(self, user_client, make_recipes):
+        """Рецепт содержит ингредиенты, теги и флаги пользователя."""
+        recipe, = make_recipes(1)
+        response = user_client.get(f'{self.RECIPES_URL}{recipe.id}/')
+        assert response.status_code == HTTPStatus.OK
+        assert len(response.data['ingredients']) == 3
+        assert response.data['tags'][0]['slug'] == 'breakfast'
+        assert response.data['is_favorited'] is False
+        assert response.data['author']['is_subscribed'] is False
+
+    def test_recipe_list_cursor_pagination(self, user_client, make_recipes):
+        """Курсорный режим отдаёт ту же ленту без count."""
+        make_recipes(5)
+        expected = [
+            recipe['id'] for recipe in
+            user_client.get(f'{self.RECIPES_URL}?limit=5').data['results']
+        ]
+        url = f'{self.RECIPES_URL}?cursor=&limit=2'
+        pages = []
+        while url:
+            response = user_client.get(url)
+            assert response.status_code == HTTPStatus.OK
+            assert 'count' not in response.data
+            pages.append(response.data)
+            url = response.data['next']
+        assert [
+            recipe['id'] for page in pages for recipe in page['results']
+        ] == expected
+        previous = user_client.get(pages[-1]['previous']).data
+        assert previous['results'] == pages[-2]['results']
+
+    @pytest.mark.parametrize('values', (
+        ['2020-01-01T00:00:00+00:00', 'abc'],
+        [[1], {}],
+        [None, 1],
+        ['не дата', 1],
+        [True, 1],
+    ))
+    def test_recipe_list_invalid_cursor(self, user_client, make_recipes,
+                                        values):
+        """Подделанный курсор даёт 404, а не ошибку сервера."""
+        make_recipes(1)
+        cursor = urlsafe_b64encode(
+            json.dumps({'v': values, 'r': False}).encode()).decode()
+        response = user_client.get(f'{self.RECIPES_URL}?cursor={cursor}')
+        assert response.status_code == HTTPStatus.NOT_FOUND
+
+    def test_recipe_list_without_count(self, user_client, make_recipes):
+        """С count=false ответ не содержит count, но содержит ссылки."""
+        make_recipes(3)
+        response = user_client.get(f'{self.RECIPES_URL}?count=false&limit=2')
+        assert response.status_code == HTTPStatus.OK
+        assert 'count' not in response.data
+        assert len(response.data['results']) == 2
+        assert response.data['previous'] is None
+        response = user_client.get(response.data['next'])
+        assert len(response.data['results']) == 1
+        assert response.data['next'] is None
+        assert response.data['previous'] is not None
+
+    def test_recipe_list_without_count_invalid_page(self, user_client,
+                                                    make_recipes):
+        """Страница за последней даёт 404 в обоих режимах, page=last
+        поддерживается только с count."""
+        make_recipes(3)
+        url = f'{self.RECIPES_URL}?limit=2'
+        for params in ('page=3', 'page=3&count=false',
+                       'page=last&count=false'):
+            response = user_client.get(f'{url}&{params}')
+            assert response.status_code == HTTPStatus.NOT_FOUND
+        response = user_client.get(f'{url}&page=last')
+        assert response.status_code == HTTPStatus.OK
+        assert len(response.data['results']) == 1
+
+    def test_anonymous_recipe_list_cache(self, client, make_recipes):
+        """Ответ анонимному пользователю кешируется до изменения рецепта."""
+        recipe, = make_recipes(1)
+        client.get(self.RECIPES_URL)
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(self.RECIPES_URL)
+        assert len(context) == 0
+        assert response.data['results'][0]['name'] == recipe.name
+
+        recipe.name = 'Новое название'
+        recipe.save()
+        response = client.get(self.RECIPES_URL)
+        assert response.data['results'][0]['name'] == 'Новое название'
+
+    def test_recipe_list_fragments_keep_user_fields(self, user_client,
+                                                    user, make_recipes):
+        """Кешированный рецепт получает актуальные поля пользователя."""
+        recipe, = make_recipes(1)
+        first = user_client.get(self.RECIPES_URL).data['results'][0]
+        assert first['is_favorited'] is False
+
+        Favorites.objects.create(user=user, recipe=recipe)
+        second = user_client.get(self.RECIPES_URL).data['results'][0]
+        assert second['is_favorited'] is True
+        assert {**second, 'is_favorited': False} == first
+
+    def test_recipe_list_sees_orm_changes(self, client, user_client, tag,
+                                          make_recipes):
+        """Изменения тегов и ингредиентов через ORM видны в списке."""
+        recipe, = make_recipes(1)
+
+        def check(slugs, amounts):
+            for api_client in (client, user_client):
+                result, = api_client.get(self.RECIPES_URL).data['results']
+                assert [item['slug'] for item in result['tags']] == slugs
+                assert sorted(
+                    item['amount'] for item in result['ingredients']
+                ) == amounts
+
+        check(['breakfast'], [1, 1, 1])
+        lunch = Tag.objects.create(name='Обед', slug='lunch')
+        recipe.tags.add(lunch)
+        check(['breakfast', 'lunch'], [1, 1, 1])
+        lunch.recipe_set.remove(recipe)
+        check(['breakfast'], [1, 1, 1])
+        RecipeIngredient.objects.filter(recipe=recipe).update(amount=5)
+        check(['breakfast'], [5, 5, 5])
+        row = recipe.recipe_ingredient.first()
+        row.amount = 7
+        row.save()
+        check(['breakfast'], [5, 5, 7])
+        row.delete()
+        check(['breakfast'], [5, 5])
+
+    def test_fast_serializer_parity(self, settings, user_client, user,
+                                    author, make_recipes):
+        """Быстрый сериализатор возвращает тот же JSON."""
+        settings.RECIPE_FRAGMENT_CACHE = False
+        recipes = make_recipes(2) + make_recipes(2, author=author)
+        Subscription.objects.create(subscriber=user, user=author)
+        Favorites.objects.create(user=user, recipe=recipes[-1])
+        urls = (self.RECIPES_URL, f'{self.RECIPES_URL}{recipes[-1].id}/')
+        for url in urls:
+            settings.RECIPE_FAST_SERIALIZER = False
+            expected = user_client.get(url).json()
+            settings.RECIPE_FAST_SERIALIZER = True
+            assert user_client.get(url).json() == expected
+
+    def test_counters(self, user, author, make_recipes):
+        """Счётчики обновляются при создании и удалении связей."""
+        recipe, = make_recipes(1, author=author)
+        favorite = Favorites.objects.create(user=user, recipe=recipe)
+        Subscription.objects.create(subscriber=user, user=author)
+        recipe.refresh_from_db()
+        author.refresh_from_db()
+        assert recipe.favorites_count == 1
+        assert author.recipes_count == 1
+        assert author.subscribers_count == 1
+
+        favorite.delete()
+        recipe.refresh_from_db()
+        assert recipe.favorites_count == 0
+
+    def test_recipe_conditional_get(self, user_client, user, make_recipes):
+        """Рецепт и список отвечают 304, пока данные не изменились."""
+        recipe, = make_recipes(1)
+        for url in (self.RECIPES_URL, f'{self.RECIPES_URL}{recipe.id}/'):
+            etag = user_client.get(url)['ETag']
+            response = user_client.get(url, HTTP_IF_NONE_MATCH=etag)
+            assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+            favorite = Favorites.objects.create(user=user, recipe=recipe)
+            response = user_client.get(url, HTTP_IF_NONE_MATCH=etag)
+            assert response.status_code == HTTPStatus.OK
+            favorite.delete()
+
+    def test_recipe_list_conditional_get_without_queries(
+            self, user_client, make_recipes):
+        """ETag списка строится по версиям кеша, без запросов к БД, в том
+        числе в режимах курсора и без подсчёта."""
+        make_recipes(2)
+        for params in ('', '?count=false', '?cursor='):
+            url = f'{self.RECIPES_URL}{params}'
+            etag = user_client.get(url)['ETag']
+            with CaptureQueriesContext(connection) as context:
+                response = user_client.get(url, HTTP_IF_NONE_MATCH=etag)
+            assert response.status_code == HTTPStatus.NOT_MODIFIED
+            assert len(context) == 0
+
+        make_recipes(1)
+        response = user_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == HTTPStatus.OK
+
+    def test_recipe_reads_skip_search_vector(self, user_client, user,
+                                             make_recipes):
+        """Поисковый вектор не читается вне поиска."""
+        recipe, = make_recipes(1)
+        Favorites.objects.create(user=user, recipe=recipe)
+        urls = (
+            self.RECIPES_URL,
+            f'{self.RECIPES_URL}?is_favorited=1',
+            f'{self.RECIPES_URL}{recipe.id}/',
+            '/api/users/subscriptions/',
+        )
+        with CaptureQueriesContext(connection) as context:
+            for url in urls:
+                assert user_client.get(url).status_code == HTTPStatus.OK
+        assert not [
+            query['sql'] for query in context.captured_queries
+            if 'search_vector' in query['sql']
+        ]
+
+    def test_recipe_etag_follows_tags(self, client, tag, make_recipes):
+        """Переименование тега меняет ETag рецепта, Last-Modified по
+        updated_at рецепта не отдаётся."""
+        recipe, = make_recipes(1)
+        url = f'{self.RECIPES_URL}{recipe.id}/'
+        response = client.get(url)
+        assert 'Last-Modified' not in response
+        tag.name = 'Новое имя'
+        tag.save()
+        response = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'],
+                              HTTP_IF_MODIFIED_SINCE=http_date())
+        assert response.status_code == HTTPStatus.OK
+        assert response.json()['tags'][0]['name'] == 'Новое имя'
+
+    def test_download_shopping_cart_formats(self, user_client, user,
+                                            make_recipes):
+        """Список покупок выгружается потоком в txt, csv и json."""
+        for recipe in make_recipes(2):
+            ShoppingList.objects.create(user=user, recipe=recipe)
+        url = f'{self.RECIPES_URL}download_shopping_cart/'
+
+        response = user_client.get(url)
+        assert response.streaming
+        assert b''.join(response.streaming_content).decode() == (
+            'Список покупок:\n\n'
+            '1) Ингредиент 0 (г): 3\n'
+            '2) Ингредиент 1 (г): 3\n'
+            '3) Ингредиент 2 (г): 3\n'
+        )
+
+        response = user_client.get(f'{url}?format=json')
+        assert json.loads(b''.join(response.streaming_content))[0] == {
+            'name': 'Ингредиент 0', 'measurement_unit': 'г', 'amount': 3
+        }
+
+        response = user_client.get(f'{url}?format=csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        assert lines[1] == '1,Ингредиент 0,г,3'
+        assert len(lines) == 4
+
+        for file_format in ('doc', 'pdf'):
+            response = user_client.get(f'{url}?format={file_format}')
+            assert response.status_code == HTTPStatus.BAD_REQUEST
+            assert response.json() == {
+                'format': ['Доступные форматы: txt, csv, json.']}
+
+    def test_download_shopping_cart_cache(self, monkeypatch, user_client,
+                                          user, make_recipes):
+        """Файл кешируется до изменения списка покупок, большой файл
+        отдаётся потоком без кеширования."""
+        recipe, other = make_recipes(2)
+        ShoppingList.objects.create(user=user, recipe=recipe)
+        url = f'{self.RECIPES_URL}download_shopping_cart/'
+        content = b''.join(user_client.get(url).streaming_content)
+        response = user_client.get(url)
+        assert not response.streaming
+        assert response.content == content
+
+        ShoppingList.objects.create(user=user, recipe=other)
+        response = user_client.get(url)
+        assert response.streaming
+        assert b''.join(response.streaming_content) != content
+
+        monkeypatch.setattr(exports, 'SHOPPING_LIST_CACHE_MAX_SIZE', 10)
+        ShoppingList.objects.filter(recipe=other).delete()
+        for _ in range(2):
+            response = user_client.get(url)
+            assert response.streaming
+            assert b''.join(response.streaming_content) == content
+
+    def test_shopping_cart_aggregate(self, user_client, user, tag,
+                                     ingredients, make_recipes):
+        """Суммы списка покупок следуют за рецептами в нём."""
+        recipe, = make_recipes(1)
+
+        def totals():
+            return dict(
+                ShoppingCartIngredient.objects
+                .filter(user=user)
+                .values_list('ingredient_id', 'total_amount')
+            )
+
+        ShoppingList.objects.create(user=user, recipe=recipe)
+        assert totals() == {ingredient.id: 1 for ingredient in ingredients}
+        version = get_cache_versions(user_namespace(user.id))
+
+        response = user_client.patch(
+            f'{self.RECIPES_URL}{recipe.id}/',
+            data={
+                'ingredients': [
+                    {'id': ingredients[0].id, 'amount': 5},
+                    {'id': ingredients[1].id, 'amount': 1},
+                ],
+                'tags': [tag.id],
+            },
+            format='json'
+        )
+        assert response.status_code == HTTPStatus.OK
+        assert totals() == {ingredients[0].id: 5, ingredients[1].id: 1}
+        assert get_cache_versions(user_namespace(user.id)) != version
+
+        ShoppingCartIngredient.objects.filter(
+            ingredient=ingredients[0]).update(total_amount=100)
+        ShoppingCartIngredient.objects.create(
+            user=user, ingredient=ingredients[2])
+        version = get_cache_versions(user_namespace(user.id))
+        call_command('recount_counters')
+        assert totals() == {ingredients[0].id: 5, ingredients[1].id: 1}
+        assert get_cache_versions(user_namespace(user.id)) != version
+
+        ShoppingList.objects.filter(user=user).delete()
+        assert totals() == {}
+
+    def test_shopping_cart_follows_orm_changes(self, user_client, user,
+                                               ingredients, make_recipes):
+        """Ингредиенты, изменённые мимо API, попадают в список покупок."""
+        recipe, = make_recipes(1)
+        ShoppingList.objects.create(user=user, recipe=recipe)
+        version = get_cache_versions(user_namespace(user.id))
+        first, second, third = recipe.recipe_ingredient.order_by(
+            'ingredient_id')
+        first.amount = 50
+        first.save()
+        second.ingredient = third.ingredient
+        third.delete()
+        second.amount = 70
+        second.save()
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredient=ingredients[1], amount=4)
+        assert dict(
+            ShoppingCartIngredient.objects
+            .filter(user=user)
+            .values_list('ingredient_id', 'total_amount')
+        ) == {ingredients[0].id: 50, ingredients[1].id: 4,
+              ingredients[2].id: 70}
+        assert get_cache_versions(user_namespace(user.id)) != version
+
+        response = user_client.get(
+            f'{self.RECIPES_URL}download_shopping_cart/?format=json')
+        assert [
+            item['amount']
+            for item in json.loads(b''.join(response.streaming_content))
+        ] == [50, 4, 70]
+
+        RecipeIngredient.objects.filter(recipe=recipe).delete()
+        assert not ShoppingCartIngredient.objects.exists()
+        recipe.delete()
+        assert not ShoppingCartIngredient.objects.exists()
+
+    def test_favorite_and_shopping_cart_writes(self, user_client, user,
+                                               make_recipes):
+        """Добавление идемпотентно, сигналы моделей срабатывают."""
+        recipe, = make_recipes(1)
+        for path, model in (('favorite', Favorites),
+                            ('shopping_cart', ShoppingList)):
+            url = f'{self.RECIPES_URL}{recipe.id}/{path}/'
+            response = user_client.post(url)
+            assert response.status_code == HTTPStatus.CREATED
+            assert response.json() == {
+                'id': recipe.id,
+                'name': recipe.name,
+                'image': recipe.image.url,
+                'cooking_time': recipe.cooking_time,
+            }
+            assert user_client.post(url).status_code == (
+                HTTPStatus.BAD_REQUEST)
+            assert model.objects.filter(user=user, recipe=recipe).count() == 1
+            missing_url = f'{self.RECIPES_URL}{recipe.id + 1}/{path}/'
+            assert user_client.post(missing_url).status_code == (
+                HTTPStatus.NOT_FOUND)
+        recipe.refresh_from_db()
+        assert recipe.favorites_count == recipe.shopping_list_count == 1
+        assert ShoppingCartIngredient.objects.filter(
+            user=user, total_amount=1).count() == 3
+
+        for path in ('favorite', 'shopping_cart'):
+            url = f'{self.RECIPES_URL}{recipe.id}/{path}/'
+            response = user_client.delete(url)
+            assert response.status_code == HTTPStatus.NO_CONTENT
+        recipe.refresh_from_db()
+        assert recipe.favorites_count == recipe.shopping_list_count == 0
+        assert not ShoppingCartIngredient.objects.exists()
+        assert user_client.delete(
+            f'{self.RECIPES_URL}{recipe.id + 1}/favorite/'
+        ).status_code == HTTPStatus.NOT_FOUND
+
+    def test_recipe_validation_batches_ids(self, user_client,
+                                           recipe_payload):
+        """Ингредиенты проверяются одним запросом, все неизвестные id
+        перечисляются в одной ошибке."""
+        def count_queries(ingredients):
+            payload = {**recipe_payload, 'ingredients': ingredients,
+                       'cooking_time': 0}
+            with CaptureQueriesContext(connection) as context:
+                response = user_client.post(
+                    self.RECIPES_URL, data=payload, format='json')
+            assert response.status_code == HTTPStatus.BAD_REQUEST
+            assert list(response.json()) == ['cooking_time']
+            return len(context)
+
+        ingredients = recipe_payload['ingredients']
+        # Первый запрос загружает справочник тегов.
+        count_queries(ingredients)
+        assert count_queries(ingredients[:1]) == count_queries(ingredients)
+        assert count_queries(ingredients) == 1
+
+        response = user_client.post(
+            self.RECIPES_URL,
+            data={
+                **recipe_payload,
+                'tags': [*recipe_payload['tags'], 556, 555],
+                'ingredients': [
+                    *ingredients,
+                    {'id': 999, 'amount': 1},
+                    {'id': 998, 'amount': 1},
+                ],
+            },
+            format='json'
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert response.json() == {
+            'tags': ['Теги с id 555, 556 не найдены.'],
+            'ingredients': ['Ингридиенты с id 998, 999 не найдены.'],
+        }
+
+    def test_update_writes_only_changes(self, user_client, tag, ingredients,
+                                        make_recipes):
+        """PATCH не перезаписывает неизменные ингредиенты и теги."""
+        recipe, = make_recipes(1)
+        url = f'{self.RECIPES_URL}{recipe.id}/'
+        payload = {
+            'name': 'Другое название',
+            'tags': [tag.id],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 1}
+                for ingredient in ingredients
+            ],
+        }
+        old_rows = set(
+            recipe.recipe_ingredient.values_list('id', 'ingredient_id'))
+        with CaptureQueriesContext(connection) as context:
+            response = user_client.patch(url, data=payload, format='json')
+        assert response.status_code == HTTPStatus.OK
+        writes = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+            and ('recipeingredient' in query['sql']
+                 or 'recipe_tags' in query['sql'])
+        ]
+        assert writes == []
+
+        payload['ingredients'] = [
+            {'id': ingredients[0].id, 'amount': 1},
+            {'id': ingredients[1].id, 'amount': 7},
+        ]
+        response = user_client.patch(url, data=payload, format='json')
+        assert response.status_code == HTTPStatus.OK
+        assert set(
+            recipe.recipe_ingredient.values_list(
+                'id', 'ingredient_id', 'amount')
+        ) == {
+            (pk, ingredient_id, 7 if ingredient_id == ingredients[1].id
+             else 1)
+            for pk, ingredient_id in old_rows
+            if ingredient_id != ingredients[2].id
+        }
+
+    def test_write_response_from_memory(self, user_client, ingredients,
+                                        recipe_payload):
+        """Ответ на создание и изменение совпадает с GET и собирается без
+        запросов после записи."""
+        def write(method, url, payload):
+            with CaptureQueriesContext(connection) as context:
+                response = getattr(user_client, method)(
+                    url, data=payload, format='json')
+            queries = [query['sql'] for query in context.captured_queries]
+            assert queries[queries.index('COMMIT') + 1:] == []
+            return response
+
+        response = write('post', self.RECIPES_URL, recipe_payload)
+        assert response.status_code == HTTPStatus.CREATED
+        url = f'{self.RECIPES_URL}{response.data["id"]}/'
+        assert response.json() == user_client.get(url).json()
+
+        payload = {
+            **recipe_payload,
+            'ingredients': [
+                {'id': ingredients[2].id, 'amount': 3},
+                {'id': ingredients[0].id, 'amount': 5},
+            ],
+        }
+        response = write('patch', url, payload)
+        assert response.status_code == HTTPStatus.OK
+        assert response.json() == user_client.get(url).json()
+
+    def test_bulk_import(self, user_client, user, recipe_payload, tag,
+                         ingredients):
+        """Импорт создаёт корректные рецепты и сообщает об ошибках
+        записей."""
+        url = f'{self.RECIPES_URL}import/'
+        invalid = {**recipe_payload, 'ingredients': [{'id': 999,
+                                                      'amount': 1}]}
+        response = user_client.post(
+            url, data=[recipe_payload, invalid, recipe_payload],
+            format='json')
+        assert response.status_code == HTTPStatus.CREATED
+        assert response.data['created'] == 2
+        assert [error['index'] for error in response.data['errors']] == [1]
+        assert list(response.data['errors'][0]['errors']) == ['ingredients']
+
+        lines = [json.dumps(recipe_payload), '{"name":', '']
+        response = user_client.post(
+            url, data='\n'.join(lines),
+            content_type='application/x-ndjson')
+        assert response.status_code == HTTPStatus.CREATED
+        assert response.data['created'] == 1
+        assert [error['index'] for error in response.data['errors']] == [1]
+
+        user.refresh_from_db()
+        assert user.recipes_count == 3
+        results = user_client.get(self.RECIPES_URL).json()['results']
+        assert len(results) == 3
+        assert len({recipe['image'] for recipe in results}) == 3
+        assert all(
+            [item['id'] for item in recipe['ingredients']]
+            == [ingredient.id for ingredient in ingredients]
+            and [item['id'] for item in recipe['tags']] == [tag.id]
+            for recipe in results
+        )
+
+    def test_import_recipes_command(self, user, recipe_payload, tmp_path):
+        path = tmp_path / 'recipes.ndjson'
+        path.write_text(
+            '\n'.join(json.dumps(recipe_payload) for _ in range(3)),
+            encoding='utf-8'
+        )
+        call_command('import_recipes', str(path), author=user.username,
+                     batch_size=2)
+        assert len(set(user.recipes.values_list('link', flat=True))) == 3
+
+    def test_import_json_array_is_streamed(self, monkeypatch, user_client,
+                                           user, recipe_payload, tmp_path):
+        """JSON-массив читается частями и распознаётся после пустых
+        строк."""
+        monkeypatch.setattr(jsonstream, 'JSON_READ_SIZE', 16)
+        path = tmp_path / 'recipes.json'
+        path.write_text(
+            '\n \n' + json.dumps([recipe_payload] * 2, indent=2),
+            encoding='utf-8'
+        )
+        call_command('import_recipes', str(path), author=user.username)
+        assert user.recipes.count() == 2
+
+        url = f'{self.RECIPES_URL}import/'
+        response = user_client.post(url, data=recipe_payload, format='json')
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        response = user_client.post(
+            url, data=json.dumps([recipe_payload])[:-1],
+            content_type='application/json')
+        assert response.status_code == HTTPStatus.CREATED
+        assert response.data['created'] == 1
+        assert [error['index'] for error in response.data['errors']] == [1]
+
+    def test_export(self, user_client, user, staff_client, make_recipes,
+                    tmp_path):
+        """Выгрузка доступна только администратору и учитывает since."""
+        recipe, = make_recipes(1)
+        Favorites.objects.create(user=user, recipe=recipe)
+        url = f'{self.RECIPES_URL}export/'
+        assert user_client.get(url).status_code == HTTPStatus.FORBIDDEN
+
+        response = staff_client.get(f'{url}?gzip=1')
+        assert response.status_code == HTTPStatus.OK
+        records = [
+            json.loads(line) for line in gzip.decompress(
+                b''.join(response.streaming_content)).splitlines()
+        ]
+        assert [record['type'] for record in records] == [
+            'recipe', 'favorite']
+        assert records[0]['ingredients'] == [
+            {'id': row.ingredient_id, 'amount': row.amount}
+            for row in recipe.recipe_ingredient.order_by('ingredient_id')
+        ]
+
+        response = staff_client.get(f'{url}?since=2999-01-01')
+        assert b''.join(response.streaming_content) == b''
+
+        path = tmp_path / 'export.ndjson'
+        call_command('export_recipes', output=str(path))
+        assert path.read_text(encoding='utf-8').splitlines() == [
+            json.dumps(record, ensure_ascii=False) for record in records
+        ]
+        out = StringIO()
+        call_command('export_recipes', stdout=out)
+        assert out.getvalue() == path.read_text(encoding='utf-8')
+        with pytest.raises(CommandError):
+            call_command('export_recipes', gzip=True, stdout=StringIO())
+        gzip_path = tmp_path / 'export.ndjson.gz'
+        call_command('export_recipes', output=str(gzip_path), gzip=True)
+        assert gzip.decompress(gzip_path.read_bytes()) == path.read_bytes()
+
+    def test_search(self, user_client, make_recipes):
+        """Поиск по названию и описанию: сначала совпадения в названии,
+        у каждого рецепта фрагмент описания с подсветкой."""
+        first, second, _ = make_recipes(3)
+        first.name, first.text = 'борщ', 'суп со свёклой'
+        second.text = 'вместо борща - щи, борщ в другой раз'
+        for recipe in (first, second):
+            recipe.save()
+
+        response = user_client.get(f'{self.RECIPES_URL}?search=борщ')
+        assert response.status_code == HTTPStatus.OK
+        results = response.json()['results']
+        assert [recipe['id'] for recipe in results] == [first.id, second.id]
+        assert results[1]['search_snippet'] == (
+            'вместо <b>борщ</b>а - щи, <b>борщ</b> в другой раз')
+
+        response = user_client.get(f'{self.RECIPES_URL}?search=борщ суп')
+        assert [recipe['id'] for recipe in response.json()['results']] == [
+            first.id]
+        response = user_client.get(self.RECIPES_URL)
+        assert 'search_snippet' not in response.json()['results'][0]
+
+    def test_search_snippet_is_escaped(self, user_client, make_recipes):
+        """Разметка из описания экранируется, выделяются только
+        совпадения."""
+        recipe, = make_recipes(1)
+        recipe.text = ('борщ <script>alert(1)</script> '
+                       '\ue000<img src=x onerror=alert(1)>\ue001')
+        recipe.save()
+        response = user_client.get(f'{self.RECIPES_URL}?search=борщ')
+        assert response.json()['results'][0]['search_snippet'] == (
+            '<b>борщ</b> &lt;script&gt;alert(1)&lt;/script&gt; '
+            '&lt;img src=x onerror=alert(1)&gt;'
+        )
@@ -0,0 +1,57 @@
+from http import HTTPStatus
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.registries import get_tag_registry
+from recipes.models import Tag
+
+
+@pytest.mark.django_db(transaction=True)
+class TestTagAPI:
+    TAGS_URL = '/api/tags/'
+
+    def test_tags_conditional_get(self, client, tag):
+        """Теги отдаются без запросов к БД и поддерживают If-None-Match."""
+        response = client.get(self.TAGS_URL)
+        assert response.status_code == HTTPStatus.OK
+        assert response.data[0]['slug'] == tag.slug
+
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(self.TAGS_URL,
+                                  HTTP_IF_NONE_MATCH=response['ETag'])
+        assert response.status_code == HTTPStatus.NOT_MODIFIED
+        assert len(context) == 0
+
+        tag.name = 'Обед'
+        tag.save()
+        response = client.get(self.TAGS_URL,
+                              HTTP_IF_NONE_MATCH=response['ETag'])
+        assert response.status_code == HTTPStatus.OK
+        assert response.data[0]['name'] == 'Обед'
+
+    def test_tag_detail(self, client, tag):
+        response = client.get(f'{self.TAGS_URL}{tag.id}/')
+        assert response.status_code == HTTPStatus.OK
+        assert response.data['slug'] == tag.slug
+        response = client.get(f'{self.TAGS_URL}{tag.id + 1}/')
+        assert response.status_code == HTTPStatus.NOT_FOUND
+
+    def test_recipe_filter_by_tag(self, client, tag, make_recipes):
+        """Фильтр рецептов по slug проверяет теги по справочнику."""
+        make_recipes(2)
+        response = client.get(f'/api/recipes/?tags={tag.slug}')
+        assert response.data['count'] == 2
+        response = client.get('/api/recipes/?tags=unknown')
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    def test_registry_expires(self, settings, tag):
+        """Справочник перестраивается по TTL, даже если версия кеша не
+        изменилась (например, bump_cache_version в другом процессе не
+        дошёл до этого)."""
+        registry = get_tag_registry()
+        Tag.objects.filter(pk=tag.pk).update(name='Новое имя')
+        assert get_tag_registry() is registry
+        settings.PROCESS_LOCAL_CACHE_TTL = 0
+        assert get_tag_registry().by_id[tag.id].name == 'Новое имя'
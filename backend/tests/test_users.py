@@ -1,6 +1,11 @@
 from http import HTTPStatus
 
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.cache import USERS_NAMESPACE, get_cache_versions
+from users.models import Subscription
 
 
 @pytest.mark.django_db(transaction=True)
@@ -31,3 +36,81 @@ class TestUserAPI:
         """Создание пользователя с неверными данными."""
         response = client.post(self.USERS_URL, data={})
         assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    def test_subscriptions_query_count_is_constant(self, user_client, user,
+                                                   django_user_model,
+                                                   make_recipes):
+        """Число запросов к подпискам не зависит от числа авторов."""
+        url = f'{self.USERS_URL}subscriptions/?recipes_limit=2'
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as context:
+                response = user_client.get(url)
+            assert response.status_code == HTTPStatus.OK
+            return len(context), response.data['results']
+
+        for i in range(3):
+            author = django_user_model.objects.create(
+                email=f'author{i}@yamdb.fake', username=f'Author{i}',
+                first_name='Author', last_name='Author')
+            make_recipes(3, author=author)
+            Subscription.objects.create(subscriber=user, user=author)
+            if i == 0:
+                one_author, _ = count_queries()
+        all_authors, results = count_queries()
+        assert one_author == all_authors
+        assert all(len(author['recipes']) == 2 for author in results)
+        assert all(author['recipes_count'] == 3 for author in results)
+
+    def test_subscribe(self, user_client, user, author, make_recipes):
+        """Подписка создаётся один раз, ответ совпадает со списком
+        подписок."""
+        make_recipes(3, author=author)
+        url = f'{self.USERS_URL}{author.id}/subscribe/?recipes_limit=2'
+        response = user_client.post(url)
+        assert response.status_code == HTTPStatus.CREATED
+        assert response.data['is_subscribed'] is True
+        assert len(response.data['recipes']) == 2
+        assert response.data['recipes_count'] == 3
+        assert response.data == user_client.get(
+            f'{self.USERS_URL}subscriptions/?recipes_limit=2'
+        ).data['results'][0]
+        author.refresh_from_db()
+        assert author.subscribers_count == 1
+
+        assert user_client.post(url).status_code == HTTPStatus.BAD_REQUEST
+        assert user_client.post(
+            f'{self.USERS_URL}{user.id}/subscribe/'
+        ).status_code == HTTPStatus.BAD_REQUEST
+        assert user_client.post(
+            f'{self.USERS_URL}{author.id + 100}/subscribe/'
+        ).status_code == HTTPStatus.NOT_FOUND
+        assert Subscription.objects.count() == 1
+
+        assert user_client.delete(url).status_code == HTTPStatus.NO_CONTENT
+        assert user_client.delete(url).status_code == HTTPStatus.BAD_REQUEST
+        author.refresh_from_db()
+        assert author.subscribers_count == 0
+
+    def test_user_changes_invalidate_only_author_data(
+            self, client, user_data, user, author, make_recipes):
+        """Версия кеша пользователей меняется, только когда меняются
+        данные автора рецептов."""
+        make_recipes(1, author=author)
+
+        def version():
+            return get_cache_versions(USERS_NAMESPACE)
+
+        initial = version()
+        assert client.post(
+            self.USERS_URL, data=user_data
+        ).status_code == HTTPStatus.CREATED
+        user.first_name = 'Другое имя'
+        user.save()
+        author.set_password('NewPassw0rd!')
+        author.save()
+        assert version() == initial
+
+        author.first_name = 'Другое имя'
+        author.save()
+        assert version() != initial
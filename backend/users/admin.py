@@ -32,7 +32,8 @@ class UserAdmin(ModelUserAdmin):
         'is_active',
         'date_joined'
     )
-    readonly_fields = ('date_joined', 'last_login')
+    readonly_fields = ('date_joined', 'last_login', 'subscribers_count',
+                       'recipes_count')
     list_display_links = (
         'id',
         'username',
@@ -43,11 +44,3 @@ class UserAdmin(ModelUserAdmin):
     )
     search_fields = ('username', 'email', 'first_name', 'last_name')
     list_filter = ('is_active',)
-
-    @admin.display(description='Кол-во подписчиков')
-    def subscribers_count(self, obj):
-        return obj.subscriptions.count()
-
-    @admin.display(description='Кол-во рецептов')
-    def recipes_count(self, obj):
-        return obj.recipes.count()
@@ -39,6 +39,16 @@ class User(AbstractUser):
         default='',
         verbose_name=_('Аватар пользователя')
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_('Кол-во рецептов')
+    )
+    subscribers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_('Кол-во подписчиков')
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -0,0 +1,21 @@
+"""Сигналы приложения users."""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.counters import increment_counter
+
+from .models import Subscription
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Subscription)
+def increment_subscribers_count(sender, instance, created, **kwargs):
+    if created:
+        increment_counter(User, instance.user_id, 'subscribers_count', 1)
+
+
+@receiver(post_delete, sender=Subscription)
+def decrement_subscribers_count(sender, instance, **kwargs):
+    increment_counter(User, instance.user_id, 'subscribers_count', -1)